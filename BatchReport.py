@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+__doc__ = """
+
+This module has the function(s) that is used to
+
+fit many samples and render one plot per sample, plus
+
+a summary table, into a single multi-page PDF report.
+
+The fits run on a process pool and the pages are drawn
+
+with matplotlib's PDF backend, so plots and tables are
+
+vector output and their text can be searched. No window is opened.
+
+"""
+
+__author__     = "Osita Sunday Nnyigide"
+
+__copyright__  = "Copyright 2022, Osita Sunday Nnyigide"
+
+__credits__    = ["Hyun Kyu"]
+
+__license__    = "MIT"
+
+__version__    = "1.0.0"
+
+__maintainer__ = "Osita Sunday Nnyigide"
+
+__email__      = "osita@protein-science.com"
+
+__status__     = "Production"
+
+__date__       = "November 22, 2023"
+
+import os
+import sys
+import time
+import textwrap
+import argparse
+import numpy as np
+from matplotlib import rc_context
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from concurrent.futures import ProcessPoolExecutor
+
+from GNFModels import GeneralizedNeutonianFluidModels, GNF_MODELS, ThinPoints, CurveGrid
+
+import warnings
+warnings.filterwarnings("ignore")
+
+A4 = (8.27, 11.69)
+TABLE_ROWS = 40
+COLUMNS = ["Sample", "Model", "Rsqr", "nfev", "Parameters"]
+WIDTHS = [0.18, 0.14, 0.08, 0.06, 0.54]
+
+# the page figure of each WatchFolder worker process, which draws all its plots on it
+TEMPLATE = None
+
+class PageTemplate:
+
+    def __init__(self, dpi=150):
+        self.dpi = dpi
+        self.fig = Figure(figsize=A4, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+        self.title = self.fig.text(0.5, 0.96, "", ha="center", va="top", family="serif", fontsize=14)
+        self.ax = self.fig.add_axes([0.14, 0.42, 0.76, 0.48])
+        self.data = self.ax.scatter([], [], s=12, label='Data')
+        self.line, = self.ax.plot([], [], '--', color='red', label="Model fitting")
+        self.ax.tick_params(axis='both', which='major', direction="out", top="on", right="on", bottom="on", length=8, labelsize=8)
+        self.ax.tick_params(axis='both', which='minor', direction="out", top="on", right="on", bottom="on", length=5, labelsize=8)
+        self.ax.legend()
+        self.text = self.fig.text(0.14, 0.34, "", va="top", family="monospace", fontsize=10)
+
+    def Draw(self, sample, result, x, y, thinned=None):
+        """
+        Update the artists of the template for one sample. `thinned` says
+        whether x and y were already thinned (by FitSample), and so are drawn
+        as they are.
+        """
+        spec = GNF_MODELS[result["model"]]
+        self.title.set_text("{} - {}".format(sample, result["model"]))
+        self.ax.set_xscale(spec.scale)
+        self.ax.set_yscale(spec.scale)
+        self.ax.set_xlabel("Shear rate [1/s]" if spec.x == "shear rate" else "Shear stress [Pa]", family="serif", fontsize=12)
+        self.ax.set_ylabel("Viscosity [Pa.s]" if spec.output == "viscosity" else "Shear stress [Pa]", family="serif", fontsize=12)
+
+        # large datasets are thinned and the model is drawn on a fixed grid, so a page
+        # costs the same however many points the sample has
+        if thinned is None:
+            keep = ThinPoints(x, y, spec.scale)
+            x, y, thinned = x[keep], y[keep], keep.size < x.size
+        self.data.set_offsets(np.column_stack([x, y]))
+        self.data.set_rasterized(thinned)
+        if "error" in result:
+            self.line.set_data([], [])
+            text = result["error"]
+        else:
+            grid = CurveGrid(x, spec.scale)
+            self.line.set_data(grid, spec.kernel(grid, *result["params"]))
+            text = "".join("{:<24}{:>14.6g} {}\n".format(label, value, unit) for label, value, unit
+                           in zip(spec.labels, result["params"], spec.units))
+            text += "{:<24}{:>14.4f}\n{:<24}{:>14d}".format("Rsqr", result["r_squared"], "Function evaluations", result["nfev"])
+            if result.get("status", "converged") != "converged":
+                text += "\n{:<24}{:>14}".format("Stopped", result["status"].replace("_", " "))
+        self.text.set_text(text)
+
+        # relim() ignores scatter collections, so the limits are set from the data
+        for values, SetLimits, scale in ((x, self.ax.set_xlim, spec.scale), (y, self.ax.set_ylim, spec.scale)):
+            values = values[np.isfinite(values) & (values > 0)] if scale == "log" else values[np.isfinite(values)]
+            if values.size:
+                lo, hi = values.min(), values.max()
+                if scale == "log":
+                    SetLimits(lo / 1.5, hi * 1.5)
+                else:
+                    pad = 0.05 * (hi - lo) or 1.0
+                    SetLimits(lo - pad, hi + pad)
+
+def StartWorker(dpi):
+    global TEMPLATE
+    TEMPLATE = PageTemplate(dpi)
+
+def FitSample(job):
+    """
+    Fit one file and return the sample name, the result and the points of
+    the page, thinned so that little data goes back to the main process.
+    """
+    filename, model, residuals, budget = job
+    sample = os.path.splitext(os.path.basename(filename))[0]
+    models = GeneralizedNeutonianFluidModels()
+    x, y = np.empty(0), np.empty(0)
+    start = time.perf_counter()
+    try:
+        x, y = models.LoadData(filename)
+        result = models.FitModel(model, x, y, residuals=residuals, **budget)
+    except Exception as e:
+        result = {"model": model, "error": "{}: {}".format(type(e).__name__, e)}
+    result["elapsed_s"] = time.perf_counter() - start
+    keep = ThinPoints(x, y, GNF_MODELS[model].scale)
+    return sample, result, x[keep], y[keep], keep.size < x.size
+
+def WrapCell(text, width):
+    lines = textwrap.wrap(text, width) or [""]
+    if len(lines) > 2:
+        lines = [lines[0], lines[1][:width - 3] + "..."]
+    return "\n".join(lines)
+
+def SummaryPages(rows, dpi=150, fontsize=7):
+    """
+    Yield table figures of `rows` (sample, result), TABLE_ROWS per page.
+    Longer cells are wrapped onto two lines.
+    """
+    # monospace glyphs are 0.6 em wide, and a cell is padded by a tenth of its width on each side
+    chars = [max(1, int(72 * A4[0] * 0.9 * 0.8 * width / (0.6 * fontsize))) for width in WIDTHS]
+    for start in range(0, max(len(rows), 1), TABLE_ROWS):
+        fig = Figure(figsize=A4, dpi=dpi)
+        fig.text(0.5, 0.96, "Summary ({} samples)".format(len(rows)), ha="center", va="top", family="serif", fontsize=14)
+        ax = fig.add_axes([0.05, 0.05, 0.9, 0.87])
+        ax.axis("off")
+        cells = []
+        for sample, result in rows[start:start + TABLE_ROWS]:
+            if "error" in result:
+                line = [sample, result["model"], "failed", "", result["error"]]
+            else:
+                params = ", ".join("{}={:.4g}".format(name, value) for name, value in zip(result["names"], result["params"]))
+                if result.get("status", "converged") != "converged":
+                    params = "[{}] {}".format(result["status"].replace("_", " "), params)
+                line = [sample, result["model"], "{:.4f}".format(result["r_squared"]), str(result["nfev"]), params]
+            cells.append([WrapCell(text, width) for text, width in zip(line, chars)])
+        if cells:
+            table = ax.table(cellText=cells, colLabels=COLUMNS, colWidths=WIDTHS, loc="upper center", cellLoc="left")
+            table.auto_set_font_size(False)
+            table.set_fontsize(fontsize)
+            for cell in table.get_celld().values():
+                cell.set_height(1 / (TABLE_ROWS + 1))
+                cell.get_text().set_family("monospace")
+        yield fig
+
+def BuildReport(filenames, model, output="report.pdf", residuals="linear", workers=None, dpi=150,
+                max_nfev=None, max_time=None):
+    """
+    Fit `model` to every file on `workers` processes and write the summary
+    table and one page per file to `output`.
+    `max_nfev` and `max_time` are the budget of each fit.
+    Returns the (sample, result) rows in file order.
+    """
+    budget = {"max_nfev": max_nfev, "max_time": max_time}
+    jobs = [(filename, model, residuals, budget) for filename in filenames]
+    chunksize = max(1, len(jobs) // (8 * (workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pages = list(executor.map(FitSample, jobs, chunksize=chunksize))
+    rows = [(sample, result) for sample, result, _, _, _ in pages]
+
+    # the report is written under a temporary name, so a failed run leaves
+    # neither a partial file nor a damaged earlier report
+    partial = output + ".part"
+    template = PageTemplate(dpi)
+    try:
+        # TrueType fonts keep the text of every page searchable
+        with rc_context({"pdf.fonttype": 42}), PdfPages(partial, metadata={"Title": "GNF fits: {}".format(model)}) as pdf:
+            # the summary table goes in front of the sample pages
+            for fig in SummaryPages(rows, dpi):
+                pdf.savefig(fig)
+            for sample, result, x, y, thinned in pages:
+                template.Draw(sample, result, x, y, thinned)
+                pdf.savefig(template.fig)
+        os.replace(partial, output)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-page PDF report of GNF fits of many samples")
+    parser.add_argument("model", choices=sorted(GNF_MODELS))
+    parser.add_argument("filenames", nargs="+")
+    parser.add_argument("--output", default="report.pdf")
+    parser.add_argument("--residuals", choices=["linear", "log", "relative"], default="linear")
+    parser.add_argument("--workers", type=int, default=None, help="rendering processes (default: all cores)")
+    parser.add_argument("--dpi", type=int, default=150, help="resolution of the plot pages")
+    parser.add_argument("--max-nfev", type=int, default=None, help="function evaluations a fit may use")
+    parser.add_argument("--max-time", type=float, default=60.0, help="seconds a fit may run")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rows = BuildReport(args.filenames, args.model, args.output, args.residuals, args.workers, args.dpi,
+                       args.max_nfev, args.max_time)
+    failed = sum("error" in result for _, result in rows)
+    print("wrote {} pages for {} samples ({} failed) to {} in {:.1f} s".format(
+          len(rows) + -(-max(len(rows), 1) // TABLE_ROWS), len(rows), failed, args.output, time.perf_counter() - start))
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+
+__doc__ = """
+
+This module has the benchmarks of the fitting code.
+
+Run python3 Benchmark.py [section ...]; with no
+
+section every benchmark is run.
+
+"""
+
+__author__     = "Osita Sunday Nnyigide"
+
+__copyright__  = "Copyright 2022, Osita Sunday Nnyigide"
+
+__credits__    = ["Hyun Kyu"]
+
+__license__    = "MIT"
+
+__version__    = "1.0.0"
+
+__maintainer__ = "Osita Sunday Nnyigide"
+
+__email__      = "osita@protein-science.com"
+
+__status__     = "Production"
+
+__date__       = "November 22, 2023"
+
+import os
+import sys
+import time
+import json
+import pickle
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from GNFModels import GeneralizedNeutonianFluidModels, GNF_MODELS, PlotData, CurveGrid, OutputPath
+from SharedData import SharedArrays, Attached
+from MultiStart import Transport, RunJobs, FitStarts
+from ModelPrediction import ModelPrediction
+from Dataset import Dataset
+from FittingService import FittingService, FittingClient
+
+import warnings
+warnings.filterwarnings("ignore")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def BestTime(function, repeat=5):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def BenchmarkResiduals(repeat=5, perturbation=1.5):
+    """
+    Plain, log and relative residuals on the example data: function
+    evaluations, Jacobian condition number at the solution, Rsqr and time.
+    Each mode starts once from the default seeds ("seed") and once from the
+    plain least-squares optimum with every parameter scaled by `perturbation`
+    ("near"), so that a bad default start is not mistaken for the residuals.
+    """
+    models = GeneralizedNeutonianFluidModels()
+    print("{:<10}{:<17}{:<7}{:<10}{:>7}{:>12}{:>10}{:>11}".format(
+          "data", "model", "start", "residuals", "nfev", "cond(J)", "Rsqr", "ms"))
+    for filename in ("data.txt", "dna.dat"):
+        x, y = models.LoadData(os.path.join(HERE, filename))
+        for model in GNF_MODELS:
+            try:
+                optimum = models.FitModel(model, x, y)["params"]
+            except Exception:
+                optimum = None
+            starts = {"seed": None}
+            if optimum is not None:
+                starts["near"] = [perturbation * p for p in optimum]
+            for start, p0 in starts.items():
+                for residuals in ("linear", "log", "relative"):
+                    try:
+                        result = models.FitModel(model, x, y, p0, residuals)
+                        elapsed = BestTime(lambda: models.FitModel(model, x, y, p0, residuals), repeat)
+                    except Exception as e:
+                        print("{:<10}{:<17}{:<7}{:<10}  failed: {}".format(filename, model, start, residuals, type(e).__name__))
+                        continue
+                    print("{:<10}{:<17}{:<7}{:<10}{:>7}{:>12.3g}{:>10.4f}{:>11.2f}".format(
+                          filename, model, start, residuals, result["nfev"], result["condition"],
+                          result["r_squared"], 1e3 * elapsed))
+
+def BenchmarkPlotting(sizes=(10**3, 10**4, 10**5, 10**6), repeat=3):
+    """
+    Time to draw a Cross fit of noisy synthetic data off screen at the
+    300 dpi of the saved plots: every point as it is ("scatter") against
+    the thinned scatter ("auto") and the hexbin ("density").
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    params = [3354.07, 42.2583, 2.68884e-5, 0.902192]
+    kernel = GNF_MODELS["Cross"].kernel
+    rng = np.random.default_rng(0)
+
+    def Render(x, y, mode):
+        fig = Figure(figsize=(6, 5), dpi=300)
+        canvas = FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111)
+        PlotData(ax, x, y, "log", mode)
+        grid = CurveGrid(x, "log")
+        ax.plot(grid, kernel(grid, *params), '--', color='red')
+        ax.set_xscale("log")
+        ax.set_yscale("log")
+        canvas.draw()
+
+    print("{:>9}{:>12}{:>12}{:>12}".format("points", "scatter ms", "auto ms", "density ms"))
+    for n in sizes:
+        x = np.geomspace(1e-2, 1e5, n)
+        y = kernel(x, *params) * np.exp(rng.normal(0, 0.05, n))
+        times = [1e3 * BestTime(lambda: Render(x, y, mode), repeat) for mode in ("scatter", "auto", "density")]
+        print("{:>9}{:>12.0f}{:>12.0f}{:>12.0f}".format(n, *times))
+
+def StressThreads(workers=8, repeat=3):
+    """
+    Run every legacy Fit*Model, FitRegisteredModel and FitModel (plain and
+    log residuals) on both example datasets, first one after another and
+    then `repeat` times over from `workers` threads at once. Every threaded
+    result must equal the serial one: parameters, Rsqr, status, function
+    evaluations and the bytes of the saved plot. No two fits may share a
+    plot file. Returns the number of violations, which make Benchmark.py
+    exit with status 1.
+    """
+    models = GeneralizedNeutonianFluidModels()
+    legacy = sorted(name for name in dir(models) if name.startswith("Fit") and name.endswith("Model")
+                    and name not in ("FitModel", "FitRegisteredModel"))
+    jobs = []
+    for filename in ("data.txt", "dna.dat"):
+        x, y = models.LoadData(os.path.join(HERE, filename))
+        for name in legacy:
+            jobs.append(("{}:{}".format(filename, name),
+                         lambda output, name=name, x=x, y=y: getattr(models, name)(x, y, output=output)))
+        for model in GNF_MODELS:
+            jobs.append(("{}:FitRegisteredModel:{}".format(filename, model),
+                         lambda output, model=model, x=x, y=y: models.FitRegisteredModel(model, x, y, output=output)))
+            for residuals in ("linear", "log"):
+                jobs.append(("{}:FitModel:{}:{}".format(filename, model, residuals),
+                             lambda output, model=model, x=x, y=y, residuals=residuals:
+                             models.FitModel(model, x, y, residuals=residuals)))
+
+    def Run(job, folder):
+        label, function = job
+        try:
+            result = function(OutputPath(label.replace(":", "_"), folder))
+        except Exception as e:
+            return ("error", type(e).__name__, str(e)), None
+        digest = None
+        if result.get("output"):
+            with open(result["output"], "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+        return (tuple(result["params"]), result["r_squared"], result["status"], result["nfev"], digest), result.get("output")
+
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        serial = [Run(job, folder)[0] for job in jobs]
+        serial_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            threaded = list(executor.map(lambda job: Run(job, folder), jobs * repeat))
+        threaded_time = time.perf_counter() - start
+
+    mismatches = [(jobs[i % len(jobs)][0], serial[i % len(jobs)], result)
+                  for i, (result, _) in enumerate(threaded) if result != serial[i % len(jobs)]]
+    outputs = [output for _, output in threaded if output]
+    print("{} fits serially in {:.1f} s, {} on {} threads in {:.1f} s".format(
+          len(jobs), serial_time, len(threaded), workers, threaded_time))
+    print("identical to the serial run: {} of {}; distinct plot files: {} of {}; failed in both: {}".format(
+          len(threaded) - len(mismatches), len(threaded), len(set(outputs)), len(outputs),
+          sum(result[0] == "error" for result in serial)))
+    for label, expected, result in mismatches[:10]:
+        print("MISMATCH {}: {} != {}".format(label, result, expected))
+    return len(mismatches) + len(outputs) - len(set(outputs))
+
+def EvaluateCross(job):
+    data, params = job
+    with Attached(*data) as (x, y):
+        return float(np.sum((y - GNF_MODELS["Cross"].kernel(x, *params)) ** 2))
+
+def BenchmarkTransport(points=10**6, workers=8, jobs=64, starts=8, max_nfev=20):
+    """
+    Hand `points` of noisy Cross data to `workers` processes pickled with
+    every job ("pickle") or once through shared memory ("shared"): bytes
+    pickled per job and wall time of `jobs` single SSE evaluations and of a
+    `starts`-guess multi-start fit held to `max_nfev` evaluations per start.
+    The times include copying the data into shared memory.
+    """
+    params = [3354.07, 42.2583, 2.68884e-5, 0.902192]
+    x = np.geomspace(1e-2, 1e5, points)
+    y = GNF_MODELS["Cross"].kernel(x, *params) * np.exp(np.random.default_rng(0).normal(0, 0.05, points))
+    guesses = np.array(params) * np.exp(np.random.default_rng(1).uniform(-1, 1, (jobs, len(params))))
+
+    print("{} points ({:.0f} MB), {} workers on {} cores".format(points, (x.nbytes + y.nbytes) / 2**20, workers, os.cpu_count()))
+    print("{:>10}{:>14}{:>16}{:>16}".format("transport", "bytes/job", "evaluate s", "multi-start s"))
+    sse = {}
+    for transport in ("pickle", "shared"):
+        with SharedArrays() as shared:
+            start = time.perf_counter()
+            data = Transport(x, y, transport, shared)
+            work = [(data, p) for p in guesses]
+            sse[transport] = RunJobs(EvaluateCross, work, workers)
+            evaluate = time.perf_counter() - start
+            size = len(pickle.dumps(work[0]))
+        start = time.perf_counter()
+        result = FitStarts("Cross", x, y, starts, workers=workers, transport=transport, max_nfev=max_nfev)
+        fit = time.perf_counter() - start
+        print("{:>10}{:>14}{:>16.2f}{:>16.2f}   best SSE {:.6g}".format(transport, size, evaluate, fit, result["sse"]))
+    print("same SSE either way: {}".format(sse["pickle"] == sse["shared"]))
+
+def BenchmarkFloat32(points=10**6, param_sets=2000, grid=10**4, repeat=3):
+    """
+    Accuracy of float32 storage for every model: each example file is
+    fitted from float64 and from float32 data, and the fitted curve is
+    predicted into float64 and float32 arrays; the largest relative
+    differences are shown, the prediction's over the values within the
+    float32 range, next to the share of values outside it. Then memory
+    and time of loading `points` rows, fitting them and predicting
+    `param_sets` x `grid` values, float64 against float32.
+    """
+    models = GeneralizedNeutonianFluidModels()
+    predictor = ModelPrediction()
+    x_grid = np.geomspace(1e-3, 1e5, 1000)
+    tiny, huge = np.finfo(np.float32).tiny, np.finfo(np.float32).max
+    print("{:>9} {:<16}{:>12}{:>12}{:>16}{:>14}".format("file", "model", "params rel", "Rsqr diff",
+                                                        "prediction rel", "out of range"))
+    for filename in ("data.txt", "dna.dat"):
+        path = os.path.join(HERE, filename)
+        data64, data32 = Dataset.FromFile(path), Dataset.FromFile(path, np.float32)
+        for model, spec in GNF_MODELS.items():
+            try:
+                fit64 = models.FitModel(model, data64.x, data64.y)
+                fit32 = models.FitModel(model, data32.x, data32.y)
+            except Exception as e:
+                print("{:>9} {:<16}failed: {}".format(filename, model, type(e).__name__))
+                continue
+            params64, params32 = np.array(fit64["params"]), np.array(fit32["params"])
+            x = x_grid if spec.x == "shear rate" else np.geomspace(data64.x.min(), data64.x.max(), 1000)
+            exact = predictor.Predict(model, params64, x)
+            stored = predictor.Predict(model, params64, x, dtype=np.float32)
+            inside = (np.abs(exact) >= tiny) & (np.abs(exact) <= huge)
+            with np.errstate(all="ignore"):
+                params_rel = np.max(np.abs(params32 - params64) / np.maximum(np.abs(params64), 1e-300))
+                prediction_rel = np.max(np.abs(stored[inside] / exact[inside] - 1), initial=0.0)
+            print("{:>9} {:<16}{:>12.1e}{:>12.1e}{:>16.1e}{:>13.0%}".format(filename, model, params_rel,
+                  abs(fit32["r_squared"] - fit64["r_squared"]), prediction_rel, 1 - inside.mean()))
+
+    params = [3354.07, 42.2583, 2.68884e-5, 0.902192]
+    kernel = GNF_MODELS["Cross"].kernel
+    x = np.geomspace(1e-2, 1e5, points)
+    y = kernel(x, *params) * np.exp(np.random.default_rng(0).normal(0, 0.05, points))
+    sets = np.array(params) * np.exp(np.random.default_rng(1).uniform(-0.5, 0.5, (param_sets, len(params))))
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "large.txt")
+        np.savetxt(path, np.column_stack([x, y]))
+        print("\n{:>8}{:>12}{:>10}{:>10}{:>14}{:>12}".format("dtype", "data MB", "load s", "fit s",
+                                                              "predict MB", "predict s"))
+        for dtype in (np.float64, np.float32):
+            data = Dataset.FromFile(path, dtype)
+            load = BestTime(lambda: Dataset.FromFile(path, dtype), 1)
+            fit = BestTime(lambda: models.FitModel("Cross", data.x, data.y, params, max_nfev=10), repeat)
+            out = predictor.Predict("Cross", sets, x[::points // grid], dtype=dtype)
+            predict = BestTime(lambda: predictor.Predict("Cross", sets, x[::points // grid], dtype=dtype, out=out), repeat)
+            print("{:>8}{:>12.1f}{:>10.2f}{:>10.2f}{:>14.1f}{:>12.3f}".format(np.dtype(dtype).name, data.nbytes / 2**20,
+                  load, fit, out.nbytes / 2**20, predict))
+
+def CheckService(workers=2):
+    """
+    Round trip through a local FittingService with FittingClient: a single
+    /fit, a batch, a repeated fit answered from the cache, strict JSON (null
+    for a non-finite condition number), 503 once the queue is full and no
+    part of a rejected batch run.
+    Returns the number of failed checks.
+    """
+    x, y = GeneralizedNeutonianFluidModels().LoadData(os.path.join(HERE, "data.txt"))
+    x, y = list(x), list(y)
+
+    async def Run():
+        service = FittingService(workers=workers)
+        ready = asyncio.Event()
+        server = asyncio.ensure_future(service.Serve(port=0, ready=ready))
+        await ready.wait()
+        client = FittingClient(*service.address)
+        checks = []
+        try:
+            status, single = await client.Fit("Cross", x, y)
+            checks.append(("single fit", status == 200 and single["r_squared"] > 0.99 and not single["cached"]))
+
+            status, batch = await client.FitMany([{"model": model, "x": x, "y": y}
+                                                  for model in ("Power-Law", "Bingham", "Williamson")])
+            results = batch.get("results", [])
+            checks.append(("batch of 3", status == 200 and len(results) == 3 and service.counters["batches"] <= 3))
+            checks.append(("null for non-finite", results[-1].get("condition", 0) is None))
+
+            status, again = await client.Fit("Cross", x, y)
+            checks.append(("cached repeat", status == 200 and again["cached"] and again["params"] == single["params"]))
+
+            # Williamson stays at its seed, where the Jacobian is singular
+            body = json.dumps({"model": "Williamson", "x": x, "y": y, "residuals": "log"}).encode()
+            reader, writer = await asyncio.open_connection(*service.address)
+            writer.write("POST /fit HTTP/1.1\r\nContent-Length: {}\r\nConnection: close\r\n\r\n".format(
+                         len(body)).encode() + body)
+            raw = (await reader.read()).split(b"\r\n\r\n", 1)[1]
+            writer.close()
+            def Reject(name):
+                raise ValueError("{} is not JSON".format(name))
+            json.loads(raw, parse_constant=Reject)
+            checks.append(("strict JSON", True))
+
+            # a batch too big for the queue is rejected before any of it is queued
+            service.max_queue, jobs = 1, service.counters["jobs"]
+            status, busy = await client.FitMany([{"model": model, "x": x, "y": y} for model in ("Ellis", "Sisko")])
+            checks.append(("batch rejected whole", status == 503 and service.counters["jobs"] == jobs
+                           and not service.pending))
+
+            service.max_queue = 0
+            status, busy = await client.Fit("Ellis", x, y)
+            checks.append(("503 when full", status == 503 and "queue is full" in busy["error"]))
+            status, cached = await client.Fit("Cross", x, y)
+            checks.append(("cache while full", status == 200 and cached["cached"]))
+        except Exception as e:
+            checks.append(("{}: {}".format(type(e).__name__, e)[:60], False))
+        finally:
+            server.cancel()
+        return checks
+
+    checks = asyncio.run(Run())
+    for name, passed in checks:
+        print("{:<24} {}".format(name, "ok" if passed else "FAILED"))
+    return sum(not passed for _, passed in checks)
+
+SECTIONS = {"residuals": BenchmarkResiduals, "plotting": BenchmarkPlotting, "threads": StressThreads,
+            "transport": BenchmarkTransport, "float32": BenchmarkFloat32, "service": CheckService}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the GNF fitting code")
+    parser.add_argument("sections", nargs="*", choices=[[]] + sorted(SECTIONS), default=[],
+                        help="benchmarks to run (default: all)")
+    args = parser.parse_args(argv)
+    # the checks among the sections return how many of their cases failed
+    failed = []
+    for name in args.sections or SECTIONS:
+        print("\n== {} ==".format(name))
+        if SECTIONS[name]():
+            failed.append(name)
+    if failed:
+        print("\nFAILED: {}".format(", ".join(failed)))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+
+__doc__ = """
+
+This module has the dataset that is fitted: the shear
+
+rate (or stress) and viscosity (or stress) columns of one
+
+sample, parsed once into read-only float64 arrays that all
+
+the GNF Models share. For very large batches the arrays
+
+may be stored as float32 instead, at half the memory.
+
+"""
+
+__author__     = "Osita Sunday Nnyigide"
+
+__copyright__  = "Copyright 2022, Osita Sunday Nnyigide"
+
+__credits__    = ["Hyun Kyu"]
+
+__license__    = "MIT"
+
+__version__    = "1.0.0"
+
+__maintainer__ = "Osita Sunday Nnyigide"
+
+__email__      = "osita@protein-science.com"
+
+__status__     = "Production"
+
+__date__       = "November 22, 2023"
+
+import warnings
+import numpy as np
+
+def StorageType(dtype):
+    """
+    The NumPy dtype that data or predictions are stored in: float64, or
+    float32 for half the memory. Fits and sums are computed in float64
+    either way.
+    """
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float32, np.float64):
+        raise ValueError("data can be stored as float32 or float64, not {}".format(dtype))
+    return dtype
+
+def ParseColumn(text, name="x", dtype=np.float64):
+    """
+    Parse whitespace separated numbers into a float64 (or float32) array in
+    one pass of NumPy's C parser, without building a list of Python strings
+    and floats.
+    """
+    # fromstring reads blank text as one phantom value of -1
+    if not text.strip():
+        raise ValueError("{} is empty".format(name))
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        try:
+            values = np.fromstring(text, dtype=StorageType(dtype), sep=" ")
+        except (ValueError, DeprecationWarning):
+            values = None
+    if values is None:
+        # the slow path only runs to name the offending entry
+        for i, token in enumerate(text.split()):
+            try:
+                float(token)
+            except ValueError:
+                raise ValueError("{} value {} ({!r}) is not a number".format(name, i + 1, token)) from None
+        raise ValueError("{} could not be read".format(name))
+    return values
+
+class Dataset:
+
+    __slots__ = ("x", "y", "source")
+
+    def __init__(self, x, y, source="", dtype=np.float64):
+        dtype = StorageType(dtype)
+        with np.errstate(over="ignore"):
+            x = np.array(x, dtype=dtype).ravel()
+            y = np.array(y, dtype=dtype).ravel()
+        if x.size != y.size:
+            raise ValueError("x has {} values but y has {}".format(x.size, y.size))
+        if x.size < 2:
+            raise ValueError("at least 2 data points are needed, got {}".format(x.size))
+        for name, values in (("x", x), ("y", y)):
+            bad = np.flatnonzero(~np.isfinite(values))
+            if bad.size:
+                raise ValueError("{} has {} NaN or infinite values{}, the first at row {}".format(
+                                 name, bad.size, " in float32" if dtype == np.float32 else "", bad[0] + 1))
+        # the arrays are shared by every fit, so nobody may change them in place
+        x.flags.writeable = False
+        y.flags.writeable = False
+        self.x = x
+        self.y = y
+        self.source = source
+
+    @classmethod
+    def FromText(cls, x_text, y_text, source="pasted data", dtype=np.float64):
+        return cls(ParseColumn(x_text, "x", dtype), ParseColumn(y_text, "y", dtype), source, dtype)
+
+    @classmethod
+    def FromFile(cls, filename, dtype=np.float64):
+        dtype = StorageType(dtype)
+        with np.errstate(over="ignore"):
+            try:
+                data = np.loadtxt(filename, dtype=dtype, ndmin=2)
+            except ValueError:
+                data = np.loadtxt(filename, dtype=dtype, ndmin=2, skiprows=2)
+        if data.shape[1] < 2:
+            raise ValueError("{} needs two columns, found {}".format(filename, data.shape[1]))
+        return cls(data[:, 0], data[:, 1], filename, dtype)
+
+    def __len__(self):
+        return self.x.size
+
+    @property
+    def dtype(self):
+        return self.x.dtype
+
+    @property
+    def nbytes(self):
+        return self.x.nbytes + self.y.nbytes
+
+    def __repr__(self):
+        return "Dataset({} {} points from {})".format(self.x.size, self.x.dtype, self.source or "arrays")
@@ -0,0 +1,395 @@
+#!/usr/bin/env python
+
+__doc__ = """
+
+This module has the function(s) that is used to
+
+serve GNF Model fits over a local HTTP/JSON (or Unix
+
+socket) interface, for LIMS and other programs.
+
+It runs headless: no Tk is imported.
+
+"""
+
+__author__     = "Osita Sunday Nnyigide"
+
+__copyright__  = "Copyright 2022, Osita Sunday Nnyigide"
+
+__credits__    = ["Hyun Kyu"]
+
+__license__    = "MIT"
+
+__version__    = "1.0.0"
+
+__maintainer__ = "Osita Sunday Nnyigide"
+
+__email__      = "osita@protein-science.com"
+
+__status__     = "Production"
+
+__date__       = "November 22, 2023"
+
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from GNFModels import GeneralizedNeutonianFluidModels, GNF_MODELS
+from ResultsStore import ResultsStore
+from SharedData import SharedArrays, Attached
+from Dataset import StorageType
+
+import warnings
+warnings.filterwarnings("ignore")
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+class ServiceBusy(Exception):
+    pass
+
+def Finite(value):
+    # NaN and inf (an Rsqr of a failed fit, the condition number of a singular
+    # Jacobian) are not JSON, so clients get null for them
+    if isinstance(value, float):
+        return value if np.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: Finite(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [Finite(v) for v in value]
+    return value
+
+def FitJob(job):
+    start = time.perf_counter()
+    try:
+        result = GeneralizedNeutonianFluidModels().FitModel(job["model"], job["x"], job["y"], job.get("p0"),
+                                                            job.get("residuals", "linear"),
+                                                            job.get("max_nfev"), job.get("max_time"))
+    except Exception as e:
+        result = {"model": job["model"], "error": "{}: {}".format(type(e).__name__, e)}
+    result["elapsed_s"] = time.perf_counter() - start
+    return result
+
+def FitBatch(jobs):
+    with Attached(*[array for job in jobs for array in (job["x"], job["y"])]) as arrays:
+        return [FitJob(dict(job, x=arrays[2 * i], y=arrays[2 * i + 1])) for i, job in enumerate(jobs)]
+
+def StoreResults(filename, entries):
+    # sqlite is synchronous, so the service runs this on a thread of its own
+    with ResultsStore(filename) as store:
+        return store.InsertMany(entries)
+
+def ValidateJob(job, dtype=np.float64):
+    if not isinstance(job, dict):
+        raise ValueError("a job must be a JSON object")
+    model = job.get("model")
+    if model not in GNF_MODELS:
+        raise ValueError("unknown model {!r}, expected one of {}".format(model, sorted(GNF_MODELS)))
+    with np.errstate(over="ignore"):
+        x = np.asarray(job.get("x", []), dtype=dtype)
+        y = np.asarray(job.get("y", []), dtype=dtype)
+    if x.ndim != 1 or x.shape != y.shape:
+        raise ValueError("x and y must be lists of the same length")
+    if not (np.all(np.isfinite(x)) and np.all(np.isfinite(y))):
+        raise ValueError("x and y must be finite {} numbers".format(np.dtype(dtype)))
+    if x.size < len(GNF_MODELS[model].params):
+        raise ValueError("{} needs at least {} points".format(model, len(GNF_MODELS[model].params)))
+    p0 = job.get("p0")
+    if p0 is not None and len(p0) != len(GNF_MODELS[model].params):
+        raise ValueError("p0 for {} must have {} values".format(model, len(GNF_MODELS[model].params)))
+    residuals = job.get("residuals", "linear")
+    if residuals not in ("linear", "log", "relative"):
+        raise ValueError("residuals must be 'linear', 'log' or 'relative'")
+    budget = {}
+    for name, cast in (("max_nfev", int), ("max_time", float)):
+        if job.get(name) is not None:
+            budget[name] = cast(job[name])
+            if budget[name] <= 0:
+                raise ValueError("{} must be positive".format(name))
+    return dict({"model": model, "x": x, "y": y, "p0": None if p0 is None else [float(p) for p in p0],
+                 "residuals": residuals, "sample": str(job.get("sample", ""))}, **budget)
+
+class FittingService:
+
+    def __init__(self, workers=None, max_queue=10000, batch_size=16, batch_window=0.002,
+                 cache_size=4096, max_body=64 * 2**20, store=None, max_time=None, dtype=np.float64):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.cache_size = cache_size
+        self.max_body = max_body
+        # completed fits are written to this ResultsStore file, one transaction per batch
+        self.store = store
+        # wall-time budget of a fit whose job does not set max_time, so one bad
+        # sample cannot hold a worker (and the batch it came in) indefinitely
+        self.max_time = max_time
+        # queued and in-flight data are held as float32 or float64; fits run in float64
+        self.dtype = StorageType(dtype)
+        self.cache = OrderedDict()
+        self.pending = {}
+        self.counters = dict.fromkeys(["requests", "jobs", "completed", "failed", "batches",
+                                       "cache_hits", "cache_misses", "rejected", "stopped", "store_errors"], 0)
+        self.running = 0
+        self.started = time.time()
+        self.pool = None
+        self.queue = None
+
+    def Key(self, job):
+        key = hashlib.sha256(json.dumps([job["model"], job["p0"], job["residuals"],
+                                         job.get("max_nfev"), job.get("max_time")]).encode())
+        key.update(job["x"].tobytes())
+        key.update(job["y"].tobytes())
+        return key.hexdigest()
+
+    def Enqueue(self, jobs):
+        """
+        Queue all of `jobs`, or none of them (ServiceBusy) when the queue has
+        no room for the ones that need a fit, so a rejected batch never runs
+        in part. Returns one awaitable result per job.
+        """
+        if self.max_time is not None:
+            jobs = [job if "max_time" in job else dict(job, max_time=self.max_time) for job in jobs]
+        keys = [self.Key(job) for job in jobs]
+        new = {key: job for key, job in zip(keys, jobs) if key not in self.cache and key not in self.pending}
+        if self.queue.qsize() + len(new) > self.max_queue:
+            self.counters["rejected"] += len(jobs)
+            raise ServiceBusy("queue is full ({} jobs)".format(self.max_queue))
+
+        loop = asyncio.get_running_loop()
+        waits = []
+        for key in keys:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.counters["cache_hits"] += 1
+                future, cached = loop.create_future(), True
+                future.set_result(self.cache[key])
+            elif key in self.pending:   # the same fit is already queued or running
+                self.counters["cache_hits"] += 1
+                future, cached = self.pending[key], True
+            else:
+                self.counters["cache_misses"] += 1
+                self.counters["jobs"] += 1
+                future, cached = loop.create_future(), False
+                self.pending[key] = future
+                self.queue.put_nowait((key, new[key], future))
+            waits.append(self.Wait(future, cached))
+        return waits
+
+    async def Wait(self, future, cached):
+        return dict(await asyncio.shield(future), cached=cached)
+
+    async def Dispatcher(self):
+        slots = asyncio.Semaphore(2 * self.workers)
+        while True:
+            batch = [await self.queue.get()]
+            # give concurrent requests a moment to join the batch
+            if self.queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.batch_window)
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            await slots.acquire()
+            task = asyncio.ensure_future(self.RunBatch(batch))
+            task.add_done_callback(lambda _: slots.release())
+
+    async def RunBatch(self, batch):
+        self.running += len(batch)
+        self.counters["batches"] += 1
+        try:
+            # the data of the whole batch go to the worker in one shared memory block
+            with SharedArrays() as shared:
+                handles = shared.Share(*[array for _, job, _ in batch for array in (job["x"], job["y"])])
+                jobs = [dict(job, x=handles[2 * i], y=handles[2 * i + 1]) for i, (_, job, _) in enumerate(batch)]
+                results = await asyncio.get_running_loop().run_in_executor(self.pool, FitBatch, jobs)
+        except Exception as e:
+            results = [{"model": job["model"], "error": "{}: {}".format(type(e).__name__, e)} for _, job, _ in batch]
+        finally:
+            self.running -= len(batch)
+
+        # the clients are answered before the results are stored, so a store
+        # that cannot be written never leaves a request (or its key) hanging
+        for (key, _, future), result in zip(batch, results):
+            del self.pending[key]
+            if "error" in result:
+                self.counters["failed"] += 1
+            else:
+                self.counters["completed"] += 1
+                self.counters["stopped"] += result.get("status") == "budget_exhausted"
+            # a fit stopped by its budget may get further next time, so it is not cached
+            if "error" not in result and result.get("status") != "budget_exhausted":
+                self.cache[key] = result
+                if len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+            if not future.done():
+                future.set_result(result)
+
+        if self.store is not None:
+            entries = [(result, job["sample"], None, None) for (_, job, _), result in zip(batch, results)]
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, StoreResults, self.store, entries)
+            except Exception as e:
+                self.counters["store_errors"] += 1
+                print("could not store {} results in {}: {}: {}".format(len(entries), self.store, type(e).__name__, e),
+                      file=sys.stderr, flush=True)
+
+    def Metrics(self):
+        return dict(self.counters, queue_depth=self.queue.qsize(), running=self.running,
+                    workers=self.workers, cache_entries=len(self.cache),
+                    uptime_s=time.time() - self.started)
+
+    async def Route(self, method, path, body):
+        if path == "/health":
+            return 200, {"status": "ok", "workers": self.workers, "uptime_s": time.time() - self.started}
+        if path == "/metrics":
+            return 200, self.Metrics()
+        if path == "/models":
+            return 200, {name: spec.ToDict() for name, spec in GNF_MODELS.items()}
+        if path != "/fit":
+            return 404, {"error": "unknown path {}".format(path)}
+        if method != "POST":
+            return 405, {"error": "use POST for /fit"}
+
+        try:
+            payload = json.loads(body)
+            batch = isinstance(payload, dict) and "jobs" in payload
+            jobs = [ValidateJob(job, self.dtype) for job in (payload["jobs"] if batch else [payload])]
+        except (ValueError, TypeError) as e:
+            return 400, {"error": str(e)}
+        try:
+            waits = self.Enqueue(jobs)
+        except ServiceBusy as e:
+            return 503, {"error": str(e)}
+        results = await asyncio.gather(*waits)
+        return 200, {"results": results} if batch else results[0]
+
+    async def HandleConnection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > self.max_body:
+                    status, payload = 413, {"error": "body larger than {} bytes".format(self.max_body)}
+                    headers["connection"] = "close"
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    self.counters["requests"] += 1
+                    try:
+                        status, payload = await self.Route(method.upper(), path.split("?")[0], body)
+                    except Exception as e:
+                        status, payload = 500, {"error": "{}: {}".format(type(e).__name__, e)}
+
+                data = json.dumps(Finite(payload), allow_nan=False).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n"
+                             "Connection: {}\r\n\r\n".format(status, REASONS[status], len(data),
+                             "keep-alive" if keep_alive else "close").encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def Serve(self, host="127.0.0.1", port=8765, unix_path=None, ready=None):
+        self.queue = asyncio.Queue()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        dispatcher = asyncio.ensure_future(self.Dispatcher())
+        if unix_path:
+            server = await asyncio.start_unix_server(self.HandleConnection, path=unix_path)
+        else:
+            server = await asyncio.start_server(self.HandleConnection, host, port)
+        self.address = unix_path or server.sockets[0].getsockname()[:2]
+        if ready is not None:
+            ready.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            dispatcher.cancel()
+            self.pool.shutdown(cancel_futures=True)
+            if unix_path and os.path.exists(unix_path):
+                os.remove(unix_path)
+
+class FittingClient:
+
+    def __init__(self, host="127.0.0.1", port=8765, unix_path=None):
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+
+    async def Request(self, method, path, payload=None):
+        if self.unix_path:
+            reader, writer = await asyncio.open_unix_connection(self.unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        body = b"" if payload is None else json.dumps(payload).encode()
+        writer.write("{} {} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                     "Content-Length: {}\r\nConnection: close\r\n\r\n".format(method, path, len(body)).encode() + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        data = await reader.readexactly(length)
+        writer.close()
+        return status, json.loads(data)
+
+    async def Fit(self, model, x, y, p0=None, residuals="linear", max_nfev=None, max_time=None):
+        return await self.Request("POST", "/fit", {"model": model, "x": list(x), "y": list(y), "p0": p0,
+                                                   "residuals": residuals, "max_nfev": max_nfev,
+                                                   "max_time": max_time})
+
+    async def FitMany(self, jobs):
+        return await self.Request("POST", "/fit", {"jobs": jobs})
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON service for fitting GNF models")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="fitting processes (default: all cores)")
+    parser.add_argument("--max-queue", type=int, default=10000, help="queued fits before requests get 503")
+    parser.add_argument("--batch-size", type=int, default=16, help="fits sent to a worker at once")
+    parser.add_argument("--cache-size", type=int, default=4096, help="fit results kept in memory")
+    parser.add_argument("--store", default=None, help="SQLite file to keep every completed fit in")
+    parser.add_argument("--max-time", type=float, default=60.0, help="seconds a fit may run unless the job sets max_time")
+    parser.add_argument("--float32", action="store_true", help="hold queued data as float32 (half the memory)")
+    args = parser.parse_args(argv)
+
+    service = FittingService(args.workers, args.max_queue, args.batch_size, cache_size=args.cache_size,
+                             store=args.store, max_time=args.max_time,
+                             dtype=np.float32 if args.float32 else np.float64)
+    print("serving GNF fits on {} with {} workers".format(
+          args.unix or "http://{}:{}".format(args.host, args.port), service.workers))
+    try:
+        asyncio.run(service.Serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+
+    sys.exit(main())
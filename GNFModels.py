@@ -0,0 +1,437 @@
+#!/usr/bin/env python
+
+__doc__ = """
+
+This program requires python 3.6 or higher.
+
+This module has the GNF Models and the function(s)
+
+that is used to fit data to them. It does not
+
+depend on the graphical user interface.
+
+"""
+
+__author__     = "Osita Sunday Nnyigide"
+
+__copyright__  = "Copyright 2022, Osita Sunday Nnyigide"
+
+__credits__    = ["Hyun Kyu"]
+
+__license__    = "MIT"
+
+__version__    = "1.0.0"
+
+__maintainer__ = "Osita Sunday Nnyigide"
+
+__email__      = "osita@protein-science.com"
+
+__status__     = "Production"
+
+__date__       = "November 22, 2023"
+
+import os
+import time
+import uuid
+import threading
+import numpy as np
+from scipy import optimize
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from ModelRegistry import GNF_MODELS
+
+import warnings
+warnings.filterwarnings("ignore")
+
+class FitStopped(Exception):
+    pass
+
+class CancellationToken:
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def Cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+class FitMonitor:
+    """
+    Counts the objective evaluations of one fit, keeps the best parameters
+    seen so far and stops the solver (by raising FitStopped from inside the
+    objective) when `max_nfev` or `max_time` seconds are used up or `token`
+    is cancelled.
+    """
+
+    def __init__(self, max_nfev=None, max_time=None, token=None):
+        self.max_nfev = max_nfev
+        self.max_time = max_time
+        self.token = token
+        self.nfev = 0
+        self.best = None
+        self.best_cost = np.inf
+        self.status = "converged"
+        self.start = time.perf_counter()
+
+    def Check(self):
+        if self.token is not None and self.token.cancelled:
+            self.status = "cancelled"
+        elif self.max_nfev is not None and self.nfev >= self.max_nfev:
+            self.status = "budget_exhausted"
+        elif self.max_time is not None and time.perf_counter() - self.start >= self.max_time:
+            self.status = "budget_exhausted"
+        else:
+            return
+        raise FitStopped(self.status)
+
+    def Record(self, params, cost):
+        self.nfev += 1
+        if np.isfinite(cost) and cost < self.best_cost:
+            self.best_cost = cost
+            self.best = np.array(params, dtype=float)
+
+    def Objective(self, function):
+        # a scalar cost of the parameters, as optimize.minimize takes it
+        def Wrapped(params, *args):
+            self.Check()
+            cost = function(params, *args)
+            self.Record(params, cost)
+            return cost
+        return Wrapped
+
+    def Model(self, function, y):
+        # a model f(x, *params), as optimize.curve_fit takes it
+        def Wrapped(x, *params):
+            self.Check()
+            predicted = function(x, *params)
+            self.Record(params, np.sum((y - predicted)**2))
+            return predicted
+        return Wrapped
+
+    def Residuals(self, function, transform=None):
+        # a residual vector, as optimize.least_squares takes it
+        def Wrapped(params, *args):
+            self.Check()
+            r = function(params, *args)
+            self.Record(params if transform is None else transform(params), np.sum(r**2))
+            return r
+        return Wrapped
+
+    def Derivative(self, function):
+        # gradients and Jacobians do not count as evaluations, but are checked
+        def Wrapped(*args):
+            self.Check()
+            return function(*args)
+        return Wrapped
+
+    def Run(self, solve, p0):
+        """
+        Return what solve() returns, or the best parameters seen so far
+        (`p0` if none) when the fit was stopped.
+        """
+        try:
+            return solve()
+        except FitStopped:
+            return np.asarray(p0, dtype=float) if self.best is None else self.best
+
+    @property
+    def stopped(self):
+        return self.status != "converged"
+
+# above PLOT_POINTS points the data are thinned (or binned) before they are
+# drawn, and the model is always drawn on CURVE_POINTS points, so the cost of
+# a plot does not grow with the size of the dataset
+PLOT_POINTS = 20000
+CURVE_POINTS = 512
+
+# matplotlib parses tick labels with one shared mathtext parser that is not
+# thread-safe, so figures are built and saved one at a time; the fits
+# themselves run concurrently
+PLOT_LOCK = threading.Lock()
+
+def CurveGrid(x, scale="log", points=CURVE_POINTS):
+    """
+    Evenly spaced (log-spaced on log axes) points over the range of `x`.
+    """
+    x = np.asarray(x, dtype=float)
+    x = x[np.isfinite(x) & (x > 0)] if scale == "log" else x[np.isfinite(x)]
+    if x.size == 0:
+        return x
+    if scale == "log":
+        return np.geomspace(x.min(), x.max(), points)
+    return np.linspace(x.min(), x.max(), points)
+
+def ThinPoints(x, y, scale="log", max_points=PLOT_POINTS):
+    """
+    Indices of at most `max_points` of the points, one per occupied cell
+    of a grid laid over the plot area, so that outliers and the shape of
+    the data are kept. Points that the axes cannot show are left out.
+    """
+    with np.errstate(all="ignore"):
+        u, v = (np.log10(x), np.log10(y)) if scale == "log" else (np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    shown = np.flatnonzero(np.isfinite(u) & np.isfinite(v))
+    if shown.size <= max_points:
+        return shown
+    side = max(int(np.sqrt(max_points)), 1)
+    cells = np.zeros(shown.size, dtype=np.int64)
+    for values in (u[shown], v[shown]):
+        lo, span = values.min(), np.ptp(values) or 1.0
+        cells = cells * side + np.minimum(((values - lo) / span * side).astype(np.int64), side - 1)
+    _, first = np.unique(cells, return_index=True)
+    return shown[np.sort(first)]
+
+def PlotData(ax, x, y, scale="log", mode="auto", max_points=PLOT_POINTS):
+    """
+    Scatter the data on `ax`. Up to `max_points` points are drawn as they
+    are; above that mode="auto" draws a rasterized thinned scatter and
+    mode="density" a hexbin of all the points.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    if mode == "scatter" or x.size <= max_points:
+        return ax.scatter(x, y, label='Data')
+    if mode == "density":
+        if scale == "log":
+            shown = (x > 0) & (y > 0)
+            x, y = x[shown], y[shown]
+        return ax.hexbin(x, y, gridsize=120, xscale=scale, yscale=scale, bins="log", mincnt=1,
+                         cmap="Blues", linewidths=0, label='Data ({} points)'.format(x.size))
+    if mode != "auto":
+        raise ValueError("plot mode must be 'auto', 'scatter' or 'density', not {!r}".format(mode))
+    keep = ThinPoints(x, y, scale, max_points)
+    return ax.scatter(x[keep], y[keep], rasterized=True, label='Data ({} of {} points)'.format(keep.size, x.size))
+
+def OutputPath(name, folder="fitted_data"):
+    """
+    A new file for the plot of one fit, so that fits run at the same time
+    (or one after another) never write over each other's plots.
+    """
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, "{}_{}_{}.png".format(name, time.strftime("%Y%m%d-%H%M%S"), uuid.uuid4().hex[:8]))
+
+def PlotFit(name, x, y, kernel, params, text, at, scale="log", xlabel="Shear rate [1/s]",
+            ylabel="Viscosity [Pa.s]", status="converged", plot="auto", output=None):
+    """
+    Draw the data and the fitted `kernel` on a new Figure and save it to
+    `output` (a new file under fitted_data/ if None, nowhere if False).
+    Only the returned figure is touched, never pyplot's current figure,
+    so fits can run on several threads at once.
+    """
+    if output is None:
+        output = OutputPath(name)
+    grid = CurveGrid(x, scale)
+    fitted = kernel(grid, *params)
+    with PLOT_LOCK:
+        fig = Figure(figsize=(6,5))
+        FigureCanvasAgg(fig)
+        ax1 = fig.add_subplot(111)
+        PlotData(ax1, x, y, scale, plot)
+        ax1.plot(grid, fitted, '--', color ='red', label ="Model fitting")
+        ax1.set_xscale(scale)
+        ax1.set_yscale(scale)
+        ax1.set_xlabel(xlabel,family="serif",  fontsize=12)
+        ax1.set_ylabel(ylabel,family="serif",  fontsize=12)
+        ax1.tick_params(axis='both',which='major', direction="out", top="on", right="on", bottom="on", length=8, labelsize=8)
+        ax1.tick_params(axis='both',which='minor', direction="out", top="on", right="on", bottom="on", length=5, labelsize=8)
+        ax1.text(*at, text)
+
+        if status != "converged":
+            ax1.set_title("Fit {}: best parameters so far".format(status.replace("_", " ")), fontsize=10)
+        ax1.legend()
+        fig.tight_layout()
+        if output:
+            fig.savefig(output, format="png",dpi=300, bbox_inches='tight')
+    return fig, output or None
+
+class GeneralizedNeutonianFluidModels:
+
+    # the original model functions, kept for existing scripts; the registry holds the expressions
+    def PowellEyringModel(self, x, eta_0, eta_inf, lbda):
+        return GNF_MODELS["PowellEyring"].kernel(x, eta_0, eta_inf, lbda)
+
+    def EllisModel(self, x, eta_0, eta_inf, lbda, a):
+        return GNF_MODELS["Ellis"].kernel(x, eta_0, eta_inf, lbda, a)
+
+    def SiskoModel(self, x, eta_inf, lbda, n):
+        return GNF_MODELS["Sisko"].kernel(x, eta_inf, lbda, n)
+
+    def WilliamsonModel(self, x, eta_0, lbda, n):
+        return GNF_MODELS["Williamson"].kernel(x, eta_0, lbda, n)
+
+    def CrossModel(self, x, eta_0, eta_inf, lbda, a):
+        return GNF_MODELS["Cross"].kernel(x, eta_0, eta_inf, lbda, a)
+
+    def PowerLawViscosity(self, x, K, n):
+        return GNF_MODELS["Power-Law"].kernel(x, K, n)
+
+    def PowerLawModel(self, params, x_data, y_data):
+        return np.sum((y_data - self.PowerLawViscosity(x_data, *params))**2)
+
+    def CarreauYasudaViscosity(self, x, eta_0, eta_inf, lbda, a, n):
+        return GNF_MODELS["Carreau-Yasuda"].kernel(x, eta_0, eta_inf, lbda, a, n)
+
+    def CarreauYasudaModel(self, params, x, y):
+        return np.sum((y - self.CarreauYasudaViscosity(x, *params))**2)
+
+    def BinghamModel(self, shear_rate, tau0, K):
+        return GNF_MODELS["Bingham"].kernel(shear_rate, tau0, K)
+
+    def CassonModel(self, shear_rate, tau0, K):
+        return GNF_MODELS["Casson"].kernel(shear_rate, tau0, K)
+
+    def HerschelBulkleyModel(self, shear_rate, tau0, K, n):
+        return GNF_MODELS["HerschelBulkley"].kernel(shear_rate, tau0, K, n)
+
+    def LoadData(self, filename):
+        try:
+            data = np.loadtxt(filename)
+        except:
+            data = np.loadtxt(filename, skiprows=2)
+        return data[:, 0], data[:, 1]
+
+    def FitModel(self, model, x, y, p0=None, residuals="linear", max_nfev=None, max_time=None, token=None):
+        """
+        Fit `model` without plotting and return the parameters, Rsqr, SSE, the
+        number of function evaluations and the condition number of the
+        Jacobian at the solution. With residuals="linear" the solver named by
+        the spec minimizes the plain SSE; "log" and "relative" fit log(f/y) or
+        (f - y)/|y| with the positive parameters of the spec taken in log space.
+        The fit stops after `max_nfev` evaluations, `max_time` seconds or when
+        `token` is cancelled; "status" then says so and "params" are the best
+        found so far. Entries of `p0` that are None keep the seed. x and y
+        may be stored as float32; the fit, SSE and Rsqr are computed in
+        float64 all the same.
+        """
+        spec = GNF_MODELS[model]
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        if p0 is not None and len(p0) != len(spec.params):
+            raise ValueError("{} takes {} initial values ({}), not {}".format(
+                             model, len(spec.params), ", ".join(spec.params), len(p0)))
+        seed = spec.Seed(x, y)
+        p0 = seed if p0 is None else [s if p is None else float(p) for p, s in zip(p0, seed)]
+        bounds = spec.Bounds(x, y)
+        monitor = FitMonitor(max_nfev, max_time, token)
+
+        if residuals in ("log", "relative"):
+            popt, status, jacobian = self.FitScaledResiduals(spec, x, y, p0, bounds, residuals, monitor)
+        elif residuals != "linear":
+            raise ValueError("residuals must be 'linear', 'log' or 'relative', not {!r}".format(residuals))
+        elif spec.solver == "minimize":
+            def SSE(params):
+                return np.sum((y - spec.kernel(x, *params))**2)
+            def Gradient(params):
+                return -2 * spec.jacobian(x, *params) @ (y - spec.kernel(x, *params))
+            converged = []
+            def Solve():
+                result = optimize.minimize(monitor.Objective(SSE), p0, jac=monitor.Derivative(Gradient),
+                                           bounds=None if bounds is None else list(zip(*bounds)))
+                converged.append(result.success)
+                return result.x
+            popt = monitor.Run(Solve, p0)
+            status = "not_converged" if converged == [False] else monitor.status
+        else:
+            extra = {} if max_nfev is None else {"maxfev": max_nfev + 1}
+            popt = monitor.Run(lambda: optimize.curve_fit(monitor.Model(spec.kernel, y), x, y, p0=p0,
+                                                          bounds=(-np.inf, np.inf) if bounds is None else bounds,
+                                                          jac=monitor.Derivative(lambda x, *params: spec.jacobian(x, *params).T),
+                                                          **extra)[0], p0)
+            status = monitor.status
+        if residuals == "linear":
+            jacobian = spec.jacobian(x, *popt).T
+        fitted_y = spec.kernel(x, *popt)
+
+        SST = np.sum((y - np.mean(y))**2)
+        SSE = np.sum((y - fitted_y)**2)
+        R_squared = 1 - (SSE / SST)
+        with np.errstate(all="ignore"):
+            condition = np.linalg.cond(jacobian) if np.all(np.isfinite(jacobian)) else np.inf
+        return {"model": model, "names": spec.params, "params": [float(p) for p in popt],
+                "r_squared": float(R_squared), "sse": float(SSE), "nfev": monitor.nfev,
+                "residuals": residuals, "condition": float(condition), "status": status,
+                "elapsed_s": time.perf_counter() - monitor.start}
+
+    def FitScaledResiduals(self, spec, x, y, p0, bounds, residuals, monitor=None):
+        # positive parameters are fitted as log(p), the others as they are
+        monitor = monitor or FitMonitor()
+        logged = np.array([name in spec.positive and p > 0 for name, p in zip(spec.params, p0)])
+        lower, upper = (np.full(len(p0), -np.inf), np.full(len(p0), np.inf)) if bounds is None else map(np.array, bounds)
+        with np.errstate(all="ignore"):
+            lower = np.where(logged, np.where(lower > 0, np.log(lower), -np.inf), lower)
+            upper = np.where(logged, np.where(upper > 0, np.log(upper), np.inf), upper)
+        if residuals == "log" and np.any(y <= 0):
+            raise ValueError("log residuals need positive data")
+        if residuals == "relative" and np.any(y == 0):
+            raise ValueError("relative residuals need non-zero data")
+
+        def Params(phi):
+            return np.where(logged, np.exp(np.where(logged, phi, 0)), phi)
+
+        def Residuals(phi):
+            fitted_y = spec.kernel(x, *Params(phi))
+            with np.errstate(all="ignore"):
+                r = np.log(fitted_y / y) if residuals == "log" else (fitted_y - y) / np.abs(y)
+            return np.nan_to_num(r, nan=1e30, posinf=1e30, neginf=-1e30)
+
+        def Jacobian(phi):
+            params = Params(phi)
+            J = spec.jacobian(x, *params).T * np.where(logged, params, 1.0)
+            scale = spec.kernel(x, *params) if residuals == "log" else np.abs(y)
+            with np.errstate(all="ignore"):
+                return np.nan_to_num(J / scale[:, np.newaxis], nan=0.0, posinf=0.0, neginf=0.0)
+
+        phi0 = np.where(logged, np.log(np.where(logged, p0, 1.0)), p0)
+        phi0 = np.clip(phi0, lower, upper)
+        phi = monitor.Run(lambda: optimize.least_squares(
+                              monitor.Residuals(Residuals, Params), phi0, jac=monitor.Derivative(Jacobian),
+                              bounds=(lower, upper),
+                              method="trf" if np.isfinite(np.r_[lower, upper]).any() else "lm").x, phi0)
+        if monitor.stopped and monitor.best is not None:
+            phi = np.where(logged, np.log(np.where(logged, monitor.best, 1.0)), monitor.best)
+        return Params(phi), monitor.status, Jacobian(phi)
+
+    def FitRegisteredModel(self, model, x, y, p0=None, max_nfev=None, max_time=None, token=None, plot="auto", output=None):
+        spec = GNF_MODELS[model]
+        result = self.FitModel(model, x, y, p0, max_nfev=max_nfev, max_time=max_time, token=token)
+
+        text = "".join("{}={:.3f}\n".format(label, value) for label, value in zip(spec.labels, result["params"]))
+        text += "Rsqr={:.3f}".format(result["r_squared"])
+        fig, path = PlotFit(model, x, y, spec.kernel, result["params"], text,
+                            (min(x) if spec.scale == "log" else max(x)/2, min(y)*2), spec.scale,
+                            "Shear rate [1/s]" if spec.x == "shear rate" else "Shear stress [Pa]",
+                            "Viscosity [Pa.s]" if spec.output == "viscosity" else "Shear stress [Pa]", result["status"], plot, output)
+        return dict(result, figure=fig, output=path)
+
+    # the original one-method-per-model API, kept for existing scripts; every
+    # model is fitted and plotted from its spec in the registry
+    def FitPowellEyringModel(self, x, y, μo=None, μf=None, λ=None, max_nfev=None, max_time=None, token=None, plot="auto", output=None):
+        return self.FitRegisteredModel("PowellEyring", x, y, [μo, μf, λ], max_nfev, max_time, token, plot, output)
+
+    def FitSiskoModel(self, x, y, μf=None, λ=None, n=None, max_nfev=None, max_time=None, token=None, plot="auto", output=None):
+        return self.FitRegisteredModel("Sisko", x, y, [μf, λ, n], max_nfev, max_time, token, plot, output)
+
+    def FitWilliamsonModel(self, x, y, μf=None, λ=None, n=None, max_nfev=None, max_time=None, token=None, plot="auto", output=None):
+        return self.FitRegisteredModel("Williamson", x, y, [μf, λ, n], max_nfev, max_time, token, plot, output)
+
+    def FitEllisModel(self, x, y, μo=None, μf=None, λ=None, n=None, max_nfev=None, max_time=None, token=None, plot="auto", output=None):
+        return self.FitRegisteredModel("Ellis", x, y, [μo, μf, λ, n], max_nfev, max_time, token, plot, output)
+
+    def FitCrossModel(self, x, y, μo=None, μf=None, λ=None, n=None, max_nfev=None, max_time=None, token=None, plot="auto", output=None):
+        return self.FitRegisteredModel("Cross", x, y, [μo, μf, λ, n], max_nfev, max_time, token, plot, output)
+
+    def FitCarreauYasudaModel(self, x, y, μo=None, μf=None, λ=None, a=None, n=None, max_nfev=None, max_time=None, token=None, plot="auto", output=None):
+        return self.FitRegisteredModel("Carreau-Yasuda", x, y, [μo, μf, λ, a, n], max_nfev, max_time, token, plot, output)
+
+    def FitPowerLawModel(self, x, y, k=None, n=None, max_nfev=None, max_time=None, token=None, plot="auto", output=None):
+        return self.FitRegisteredModel("Power-Law", x, y, [k, n], max_nfev, max_time, token, plot, output)
+
+    def FitBinghamModel(self, x, y, τ=None, μo=None, max_nfev=None, max_time=None, token=None, plot="auto", output=None):
+        return self.FitRegisteredModel("Bingham", x, y, [τ, μo], max_nfev, max_time, token, plot, output)
+
+    def FitHerschelBulkleyModel(self, x, y, τo=None, k=None, n=None, max_nfev=None, max_time=None, token=None, plot="auto", output=None):
+        return self.FitRegisteredModel("HerschelBulkley", x, y, [τo, k, n], max_nfev, max_time, token, plot, output)
+
+    def FitCassonModel(self, x, y, τo=None, μo=None, max_nfev=None, max_time=None, token=None, plot="auto", output=None):
+        return self.FitRegisteredModel("Casson", x, y, [τo, μo], max_nfev, max_time, token, plot, output)
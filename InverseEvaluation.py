@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+
+__doc__ = """
+
+This module has the function(s) that is used to
+
+find the shear rate at which a fitted GNF Model
+
+reaches a target viscosity or stress.
+
+"""
+
+__author__     = "Osita Sunday Nnyigide"
+
+__copyright__  = "Copyright 2022, Osita Sunday Nnyigide"
+
+__credits__    = ["Hyun Kyu"]
+
+__license__    = "MIT"
+
+__version__    = "1.0.0"
+
+__maintainer__ = "Osita Sunday Nnyigide"
+
+__email__      = "osita@protein-science.com"
+
+__status__     = "Production"
+
+__date__       = "November 22, 2023"
+
+import numpy as np
+
+from GNFModels import GNF_MODELS
+from ModelPrediction import ModelPrediction
+
+import warnings
+warnings.filterwarnings("ignore")
+
+# (model, quantity) -> x for the target y, where the model can be inverted exactly
+CLOSED_FORMS = {
+    ("Power-Law", "viscosity")      : lambda y, K, n: (y / K) ** (1 / (n - 1)),
+    ("Power-Law", "stress")         : lambda y, K, n: (y / K) ** (1 / n),
+    ("Bingham", "stress")           : lambda y, tau0, K: (y - tau0) / K,
+    ("Bingham", "viscosity")        : lambda y, tau0, K: tau0 / (y - K),
+    ("Casson", "stress")            : lambda y, tau0, K: np.where(y >= np.sqrt(tau0), (y - np.sqrt(tau0))**2 / K, np.nan),
+    ("Casson", "viscosity")         : lambda y, tau0, K: ((np.sqrt(K) + np.sqrt(K + 4 * y * np.sqrt(tau0))) / (2 * y))**2,
+    ("HerschelBulkley", "stress")   : lambda y, tau0, K, n: ((y - tau0) / K) ** (1 / n),
+    ("Sisko", "viscosity")          : lambda y, eta_inf, lbda, n: ((y - eta_inf) / lbda + 1) ** (1 / n),
+    ("Williamson", "viscosity")     : lambda y, eta_0, lbda, n: (eta_0 / y - 1) ** (1 / n) / lbda,
+    ("Cross", "viscosity")          : lambda y, eta_0, eta_inf, lbda, a: ((eta_0 - y) / (y - eta_inf)) ** (1 / a) / lbda,
+    ("Ellis", "viscosity")          : lambda y, eta_0, eta_inf, lbda, a: ((eta_0 - y) / (y - eta_inf)) ** (1 / a) / lbda,
+}
+
+class InverseEvaluation(ModelPrediction):
+
+    def __init__(self, bracket=(1e-8, 1e8), rtol=1e-12, maxiter=100, **kwargs):
+        super().__init__(**kwargs)
+        self.bracket = bracket
+        self.rtol = rtol
+        self.maxiter = maxiter
+
+    def Solve(self, model, params, target, quantity):
+        """
+        Bracketed secant (Illinois) iteration in log shear rate, run on all
+        targets at once; each pass evaluates the model only for the targets
+        that have not converged yet.
+        """
+        f = lambda u, y: self.Predict(model, params, np.exp(u), quantity)[0] - y
+        lo = np.full(target.shape, np.log(self.bracket[0]))
+        hi = np.full(target.shape, np.log(self.bracket[1]))
+        f_lo, f_hi = f(lo, target), f(hi, target)
+        u = np.full(target.shape, np.nan)
+
+        # targets the bracket does not enclose have no solution in range
+        active = np.flatnonzero(np.isfinite(f_lo) & np.isfinite(f_hi) & (np.sign(f_lo) != np.sign(f_hi)))
+        exact = active[f_lo[active] == 0]
+        u[exact] = lo[exact]
+        active = active[f_lo[active] != 0]
+        side = np.zeros(target.shape, dtype=np.int8)
+
+        for _ in range(self.maxiter):
+            if not active.size:
+                break
+            a, b, fa, fb = lo[active], hi[active], f_lo[active], f_hi[active]
+            c = b - fb * (b - a) / (fb - fa)
+            c = np.where(np.isfinite(c) & (c > a) & (c < b), c, 0.5 * (a + b))
+            fc = f(c, target[active])
+
+            # keep the bracket around the sign change; halve the value of an
+            # end point that is retained twice in a row (Illinois step)
+            left = np.sign(fc) == np.sign(fa)
+            lo[active] = np.where(left, c, a)
+            f_lo[active] = np.where(left, fc, np.where(side[active] == -1, 0.5 * fa, fa))
+            hi[active] = np.where(left, b, c)
+            f_hi[active] = np.where(left, np.where(side[active] == 1, 0.5 * fb, fb), fc)
+            side[active] = np.where(left, 1, -1)
+
+            done = (fc == 0) | (hi[active] - lo[active] <= self.rtol * np.maximum(1.0, np.abs(c)))
+            u[active[done]] = c[done]
+            active = active[~done]
+
+        u[active] = 0.5 * (lo[active] + hi[active])
+        return np.exp(u)
+
+    def ShearRate(self, model, params, target, quantity=None):
+        """
+        Return the shear rate (the x axis of `model`) at which the model
+        reaches each `target` viscosity or stress; nan where there is none
+        inside `bracket`.
+        """
+        spec = GNF_MODELS[model]
+        quantity = quantity or spec.output
+        params = np.asarray(params, dtype=np.float64)
+        target = np.asarray(target, dtype=np.float64)
+        shape = target.shape
+        target = np.ravel(target)
+
+        closed_form = CLOSED_FORMS.get((model, quantity))
+        if closed_form is not None:
+            x = closed_form(target, *params)
+            x = np.where(np.isfinite(x) & (x >= 0), x, np.nan)
+        else:
+            x = self.Solve(model, params, target, quantity)
+        return x.reshape(shape)
+
+    def ShearRateForViscosity(self, model, params, viscosity):
+        return self.ShearRate(model, params, viscosity, quantity="viscosity")
+
+    def ShearRateForStress(self, model, params, stress):
+        return self.ShearRate(model, params, stress, quantity="stress")
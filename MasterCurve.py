@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+
+__doc__ = """
+
+This module has the function(s) that is used to
+
+fit one GNF Model jointly to curves measured at several
+
+temperatures (time-temperature superposition), with a
+
+shift factor per temperature or an Arrhenius/WLF shift law.
+
+"""
+
+__author__     = "Osita Sunday Nnyigide"
+
+__copyright__  = "Copyright 2022, Osita Sunday Nnyigide"
+
+__credits__    = ["Hyun Kyu"]
+
+__license__    = "MIT"
+
+__version__    = "1.0.0"
+
+__maintainer__ = "Osita Sunday Nnyigide"
+
+__email__      = "osita@protein-science.com"
+
+__status__     = "Production"
+
+__date__       = "November 22, 2023"
+
+import sys
+import argparse
+import numpy as np
+from scipy import optimize
+from scipy import sparse
+
+from GNFModels import GeneralizedNeutonianFluidModels, GNF_MODELS, FitMonitor, FitStopped
+
+import warnings
+warnings.filterwarnings("ignore")
+
+LN10 = np.log(10)
+STEP = 1e-30
+SHIFT_PARAMS = {"free": None, "arrhenius": ["Ea/R"], "wlf": ["C1", "C2"]}
+# seeds taken from the reference curve itself, tried next to the registry's fixed
+# seeds, which are tuned to one data set
+DATA_SEEDS = {"μo": "max(y)", "μf": "min(y)", "λ": "1 / median(x)", "K": "median(y) * sqrt(median(x))",
+              "a": 2.0, "n": 0.5}
+# a "converged" fit below this Rsqr, with a positive parameter <= 0 or a negative viscosity,
+# is reported as a poor fit
+MIN_R_SQUARED = 0.9
+
+class MasterCurveFit(GeneralizedNeutonianFluidModels):
+
+    def __init__(self, model, shift="free", residuals="log"):
+        spec = GNF_MODELS[model]
+        if spec.x != "shear rate":
+            raise ValueError("{} is a function of {}; master curves need shear-rate models".format(model, spec.x))
+        if shift not in SHIFT_PARAMS:
+            raise ValueError("shift must be one of {}".format(sorted(SHIFT_PARAMS)))
+        if residuals not in ("log", "linear"):
+            raise ValueError("residuals must be 'log' or 'linear'")
+        self.model = model
+        self.shift = shift
+        self.residuals = residuals
+        # a viscosity curve shifts as a*f(a*x), a stress curve as f(a*x)
+        self.vertical = 1.0 if spec.output == "viscosity" else 0.0
+
+    def Stack(self, curves, T_ref):
+        temperatures = np.array([T for T, _, _ in curves], dtype=float)
+        if T_ref is None:
+            T_ref = temperatures[len(temperatures) // 2]
+        if T_ref not in temperatures:
+            raise ValueError("the reference temperature {} is not one of the curves".format(T_ref))
+        self.temperatures = temperatures
+        self.T_ref = T_ref
+        self.ref = int(np.flatnonzero(temperatures == T_ref)[0])
+        self.x = np.concatenate([np.asarray(x, dtype=float) for _, x, _ in curves])
+        self.y = np.concatenate([np.asarray(y, dtype=float) for _, _, y in curves])
+        self.curve = np.concatenate([np.full(len(x), i) for i, (_, x, _) in enumerate(curves)])
+        self.free = [i for i in range(len(curves)) if i != self.ref]
+
+    def Shifts(self, q):
+        # ln a_T for every curve from the shift parameters q
+        if self.shift == "free":
+            s = np.zeros(len(self.temperatures), dtype=np.result_type(q, float))
+            s[self.free] = q
+            return s
+        if self.shift == "arrhenius":
+            return q[0] * (1 / self.temperatures - 1 / self.T_ref)
+        dT = self.temperatures - self.T_ref
+        return -LN10 * q[0] * dT / (q[1] + dT)
+
+    def ShiftDerivatives(self, q):
+        # d ln a_T / dq, one column per shift parameter
+        if self.shift == "arrhenius":
+            return (1 / self.temperatures - 1 / self.T_ref)[:, np.newaxis]
+        dT = self.temperatures - self.T_ref
+        return np.column_stack([-LN10 * dT / (q[1] + dT), LN10 * q[0] * dT / (q[1] + dT)**2])
+
+    def Evaluate(self, theta, s_rows):
+        a = np.exp(s_rows)
+        return a**self.vertical * GNF_MODELS[self.model].kernel(a * self.x, *theta)
+
+    def Split(self, params):
+        p = len(GNF_MODELS[self.model].params)
+        return params[:p], params[p:]
+
+    def Residuals(self, params):
+        theta, q = self.Split(params)
+        predicted = self.Evaluate(theta, self.Shifts(q)[self.curve])
+        r = np.log(predicted) - np.log(self.y) if self.residuals == "log" else predicted - self.y
+        return np.nan_to_num(r, nan=1e30, posinf=1e30, neginf=-1e30)
+
+    def Jacobian(self, params):
+        """
+        Block-sparse Jacobian: the shape parameters give a dense m x p block,
+        each free shift factor a column that is non-zero only on its own
+        curve, and an Arrhenius/WLF law one or two dense columns.
+        """
+        theta, q = self.Split(params)
+        s_rows = self.Shifts(q)[self.curve]
+        a = np.exp(s_rows)
+        predicted = a**self.vertical * GNF_MODELS[self.model].kernel(a * self.x, *theta)
+        shape_block = (a**self.vertical * GNF_MODELS[self.model].jacobian(a * self.x, *theta)).T
+        # d prediction / d ln a_T, by complex step on every row's shift at once
+        with np.errstate(all="ignore"):
+            ds = self.Evaluate(theta, s_rows + 1j * STEP).imag / STEP
+
+        m = len(self.y)
+        if self.shift == "free":
+            rows = np.flatnonzero(self.curve != self.ref)
+            columns = np.searchsorted(self.free, self.curve[rows])
+            shift_block = sparse.csr_matrix((ds[rows], (rows, columns)), shape=(m, len(self.free)))
+        else:
+            shift_block = sparse.csr_matrix(ds[:, np.newaxis] * self.ShiftDerivatives(q)[self.curve])
+
+        jac = sparse.hstack([sparse.csr_matrix(shape_block), shift_block], format="csr")
+        if self.residuals == "log":
+            jac = sparse.diags(1 / predicted) @ jac
+        jac.data = np.nan_to_num(jac.data, nan=0.0, posinf=0.0, neginf=0.0)
+        return jac
+
+    def InitialGuess(self, p0=None):
+        spec = GNF_MODELS[self.model]
+        on_ref = self.curve == self.ref
+        if p0 is None:
+            x, y = self.x[on_ref], self.y[on_ref]
+            seeds = [spec.Seed(x, y)]
+            if spec.output == "viscosity":
+                seeds.append([spec.Evaluate(DATA_SEEDS.get(name, p), x, y) for name, p in zip(spec.params, spec.p0)])
+            # the reference fit from each seed; the best one starts the joint fit
+            best = -np.inf
+            for seed in seeds:
+                try:
+                    result = self.FitModel(self.model, x, y, seed, residuals=self.residuals)
+                except Exception:
+                    continue
+                if result["r_squared"] > best:
+                    best, p0 = result["r_squared"], result["params"]
+            if best == -np.inf:
+                p0 = seeds[-1]
+        elif len(p0) != len(spec.params):
+            raise ValueError("p0 of {} needs {} values, for {}".format(self.model, len(spec.params), ", ".join(spec.params)))
+
+        # ln a_T of each curve by a 1-d fit against the reference shape
+        s = np.zeros(len(self.temperatures))
+        for i in self.free:
+            on_curve = self.curve == i
+            x, y = self.x[on_curve], self.y[on_curve]
+            def Misfit(s_i):
+                a = np.exp(s_i)
+                r = np.log(np.abs(a**self.vertical * spec.kernel(a * x, *p0))) - np.log(np.abs(y))
+                return np.sum(r**2) if np.all(np.isfinite(r)) else np.inf
+            s[i] = optimize.minimize_scalar(Misfit, bounds=(-30, 30), method="bounded").x
+
+        if self.shift == "free":
+            q = s[self.free]
+        elif self.shift == "arrhenius":
+            u = 1 / self.temperatures - 1 / self.T_ref
+            q = [np.dot(u, s) / np.dot(u, u)]
+        else:
+            # dT / -log10(a_T) = C2/C1 + dT/C1 is a straight line in dT
+            dT = (self.temperatures - self.T_ref)[self.free]
+            slope, intercept = np.polyfit(dT, dT / (-s[self.free] / LN10), 1)
+            q = [1 / slope, intercept / slope] if slope > 0 and intercept > 0 else [17.44, 51.6]
+        return np.concatenate([np.asarray(p0, dtype=float), q])
+
+    def Fit(self, curves, T_ref=None, p0=None, max_nfev=None, max_time=None, token=None):
+        """
+        Fit `curves`, a list of (temperature, x, y), to one shared model shape
+        and a shift factor a_T per temperature (a_T = 1 at T_ref).
+        """
+        self.Stack(curves, T_ref)
+        params0 = self.InitialGuess(p0)
+        monitor = FitMonitor(max_time=max_time, token=token)
+        try:
+            result = optimize.least_squares(monitor.Residuals(self.Residuals), params0,
+                                            jac=monitor.Derivative(self.Jacobian), method="trf",
+                                            tr_solver="lsmr", x_scale="jac", max_nfev=max_nfev)
+            params, nfev, njev, message = result.x, result.nfev, result.njev, result.message
+            if result.status == 0:
+                monitor.status = "budget_exhausted"
+        except FitStopped:
+            params = params0 if monitor.best is None else monitor.best
+            nfev, njev, message = monitor.nfev, None, "stopped: {}".format(monitor.status.replace("_", " "))
+        theta, q = self.Split(params)
+        shifts = np.exp(self.Shifts(q))
+        predicted = self.Evaluate(theta, np.log(shifts)[self.curve])
+
+        SST = np.sum((self.y - np.mean(self.y))**2)
+        SSE = np.sum((self.y - predicted)**2)
+        r_squared = 1 - SSE / SST
+        if monitor.status == "converged":
+            spec = GNF_MODELS[self.model]
+            unphysical = [name for name, value, unit in zip(spec.params, theta, spec.units)
+                          if not (value > 0 if name in spec.positive else value >= 0 or unit != "Pa.s")]
+            if unphysical:
+                monitor.status, message = "poor_fit", "{} left the physical range".format(", ".join(unphysical))
+            elif not r_squared >= MIN_R_SQUARED:
+                monitor.status, message = "poor_fit", "Rsqr {:.4g} is below {}; try another --p0".format(r_squared, MIN_R_SQUARED)
+        report = {"model": self.model, "shift": self.shift, "T_ref": self.T_ref,
+                  "params": dict(zip(GNF_MODELS[self.model].params, theta)),
+                  "a_T": dict(zip(self.temperatures, shifts)),
+                  "r_squared": r_squared, "sse": SSE, "cost": np.sum(self.Residuals(params)**2),
+                  "nfev": nfev, "njev": njev, "status": monitor.status, "message": message,
+                  "jacobian_nnz": self.Jacobian(params).nnz, "jacobian_shape": (len(self.y), len(params))}
+        if SHIFT_PARAMS[self.shift]:
+            report["shift_params"] = dict(zip(SHIFT_PARAMS[self.shift], q))
+        return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Joint time-temperature superposition fit of a GNF model")
+    parser.add_argument("model", choices=sorted(GNF_MODELS))
+    parser.add_argument("curves", nargs="+", metavar="T:FILE", help="temperature and data file of each curve")
+    parser.add_argument("--ref", type=float, default=None, help="reference temperature (default: the middle curve)")
+    parser.add_argument("--shift", choices=sorted(SHIFT_PARAMS), default="free")
+    parser.add_argument("--residuals", choices=["log", "linear"], default="log")
+    parser.add_argument("--p0", type=lambda text: [float(value) for value in text.split(",")], default=None,
+                        metavar="P1,P2,...", help="comma-separated initial values of the model parameters, "
+                        "e.g. --p0=1000,1,1,0.8 (default: fitted to the reference curve)")
+    args = parser.parse_args(argv)
+
+    fit = MasterCurveFit(args.model, args.shift, args.residuals)
+    curves = []
+    for entry in args.curves:
+        T, filename = entry.split(":", 1)
+        curves.append((float(T),) + tuple(fit.LoadData(filename)))
+    report = fit.Fit(curves, args.ref, args.p0)
+
+    print("{} master curve at T_ref={:g}, Rsqr={:.4f}, nfev={}".format(
+          report["model"], report["T_ref"], report["r_squared"], report["nfev"]))
+    for name, value in report["params"].items():
+        print("{:>6} = {:.6g}".format(name, value))
+    for name, value in report.get("shift_params", {}).items():
+        print("{:>6} = {:.6g}".format(name, value))
+    for T, a in report["a_T"].items():
+        print("a_T({:g}) = {:.6g}".format(T, a))
+    if report["status"] != "converged":
+        print("{}: {}".format(report["status"].replace("_", " "), report["message"]), file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -30,342 +30,29 @@ __date__       = "November 22, 2023"
 
 import os
 import customtkinter
-import sys
-import numpy as np
 import tkinter as tk
 from tkinter import *
-from scipy import optimize
 from tkinter import filedialog
-from matplotlib import gridspec
-import matplotlib.pyplot as plt
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+
+from GNFModels import GeneralizedNeutonianFluidModels, GNF_MODELS
+from Dataset import Dataset
 
 import warnings
 warnings.filterwarnings("ignore")
 
-class GeneralizedNeutonianFluidModels:
-
-    def PowellEyringModel(self, x, eta_0, eta_inf, lbda):
-        return eta_inf + (eta_0 - eta_inf) * (np.arcsinh(lbda * x) / (lbda * x))
-
-    def EllisModel(self, x, eta_0, eta_inf, lbda, a) : 
-        return eta_inf + ((eta_0 - eta_inf)/ (1 + (lbda * x) ** a))
-
-    def SiskoModel(self, x, eta_inf, lbda, n) :
-        return eta_inf + (lbda*(x**n-1))
-
-    def WilliamsonModel(self, x, eta_0, lbda, n) :
-        return eta_0/ (1 + (lbda * x) ** n)
-
-    def CrossModel(self, x , eta_0, eta_inf, lbda, a):
-        return eta_inf + ((eta_0 - eta_inf)/ (1 + (lbda * x) ** a))
-
-    def PowerLawModel(self, params, x_data, y_data):
-        K, n = params
-        y_predicted = K * x_data**(n-1)
-        error = np.sum((y_data - y_predicted)**2) 
-        return error
-
-    def CarreauYasudaModel(self, params, x, y):
-        eta_0, eta_inf, lbda, a, n =params
-        y_predicted = eta_inf + (eta_0 - eta_inf) * (1 + (lbda * x) ** a) ** ((n - 1) / a)
-        error=np.sum((y - y_predicted)**2)
-        return error
-
-    def BinghamModel(self, shear_rate, tau0, K):
-        return tau0 + K * shear_rate
-
-    def CassonModel(self, shear_rate, tau0, K):
-        return np.sqrt(tau0) + np.sqrt(K * shear_rate)
-
-    def HerschelBulkleyModel(self, shear_rate, tau0, K, n):
-        return tau0 + K * shear_rate**n
-
-    def FitPowellEyringModel(self, x, y, μo=3354.07, μf=42.2583, λ=2.68884e-5):
-        bounds = ([min(y), 0, -np.inf], [max(y), min(y), np.inf])
-        popt, pcov = optimize.curve_fit(self.PowellEyringModel, x, y, p0=[μo , μf, λ])
-        fitted_y=self.PowellEyringModel(x, *popt)
-
-        SST = np.sum((y - np.mean(y))**2)
-        SSE = np.sum((y - fitted_y)**2)
-        R_squared = 1 - (SSE / SST)
-
-        fig = plt.figure(figsize=(6,5))
-        gs = gridspec.GridSpec(1,1)
-        ax1 = fig.add_subplot(gs[0])
-        plt.scatter(x, y, label='Data')
-        ax1.plot(x, fitted_y, '--', color ='red', label ="Model fitting")
-        ax1.set_xscale('log')
-        ax1.set_yscale('log')
-        ax1.set_xlabel("Shear rate [1/s]",family="serif",  fontsize=12)
-        ax1.set_ylabel("Viscosity [Pa.s]",family="serif",  fontsize=12)
-        ax1.tick_params(axis='both',which='major', direction="out", top="on", right="on", bottom="on", length=8, labelsize=8)
-        ax1.tick_params(axis='both',which='minor', direction="out", top="on", right="on", bottom="on", length=5, labelsize=8)
-
-        plt.text(min(x),min(y)*2,'Newtonian viscosity={:.3f}\nInfinite viscosity={:.3f}\nConsistency={:.3f}\nRsqr={:.3f}'.format\
-                (popt[0], popt[1], popt[2], R_squared)) 
-
-        plt.legend()
-        fig.tight_layout()
-        fig.savefig("fitted_data.png", format="png",dpi=300, bbox_inches='tight')
-        plt.show()
-
-    def FitSiskoModel(self, x, y, μf=42.2583, λ=2.68884e-5, n=1):
-        popt, pcov = optimize.curve_fit(self.SiskoModel, x, y, p0=[μf, λ, n])
-        fitted_y=self.SiskoModel(x, *popt)
-
-        SST = np.sum((y - np.mean(y))**2)
-        SSE = np.sum((y - fitted_y)**2)
-        R_squared = 1 - (SSE / SST)
-
-        fig = plt.figure(figsize=(6,5))
-        gs = gridspec.GridSpec(1,1)
-        ax1 = fig.add_subplot(gs[0])
-        plt.scatter(x, y, label='Data')
-        ax1.plot(x, fitted_y, '--', color ='red', label ="Model fitting")
-        ax1.set_xscale('log')
-        ax1.set_yscale('log')
-        ax1.set_xlabel("Shear rate [1/s]",family="serif",  fontsize=12)
-        ax1.set_ylabel("Viscosity [Pa.s]",family="serif",  fontsize=12)
-        ax1.tick_params(axis='both',which='major', direction="out", top="on", right="on", bottom="on", length=8, labelsize=8)
-        ax1.tick_params(axis='both',which='minor', direction="out", top="on", right="on", bottom="on", length=5, labelsize=8)
-
-        plt.text(min(x),min(y)*2,'Infinite viscosity={:.3f}\nConsistency={:.3f}\nPower law index={:.3f}\nRsqr={:.3f}'.format(popt[0], popt[1], popt[2], R_squared)) 
-        plt.legend()
-        fig.tight_layout()
-        fig.savefig("fitted_data.png", format="png",dpi=300, bbox_inches='tight')
-        plt.show()
-
-    def FitWilliamsonModel(self, x, y, μf=3354.07, λ=2.68884e-5, n=-1945.61):
-        popt, pcov = optimize.curve_fit(self.WilliamsonModel, x, y, p0=[μf, λ, n])
-        fitted_y=self.WilliamsonModel(x, *popt)
-
-        SST = np.sum((y - np.mean(y))**2)
-        SSE = np.sum((y - fitted_y)**2)
-        R_squared = 1 - (SSE / SST)
-
-        fig = plt.figure(figsize=(6,5))
-        gs = gridspec.GridSpec(1,1)
-        ax1 = fig.add_subplot(gs[0])
-        plt.scatter(x, y, label='Data')
-        ax1.plot(x, fitted_y, '--', color ='red', label ="Model fitting")
-        ax1.set_xscale('log')
-        ax1.set_yscale('log')
-        ax1.set_xlabel("Shear rate [1/s]",family="serif",  fontsize=12)
-        ax1.set_ylabel("Viscosity [Pa.s]",family="serif",  fontsize=12)
-        ax1.tick_params(axis='both',which='major', direction="out", top="on", right="on", bottom="on", length=8, labelsize=8)
-        ax1.tick_params(axis='both',which='minor', direction="out", top="on", right="on", bottom="on", length=5, labelsize=8)
-
-        plt.text(min(x),min(y)*2,'Infinite viscosity={:.3f}\nConsistency={:.3f}\nPower law index={:.3f}\nRsqr={:.3f}'.format(popt[0], popt[1], popt[2], R_squared)) 
-        plt.legend()
-        fig.tight_layout()
-        fig.savefig("fitted_data.png", format="png",dpi=300, bbox_inches='tight')
-        plt.show()
-
-    def FitEllisModel(self, x, y, μo=3354.07, μf=42.2583, λ=2.68884e-5, n=0.902192):
-        popt, pcov = optimize.curve_fit(self.EllisModel, x, y, p0=[μo , μf, λ, n])
-        fitted_y=self.EllisModel(x, *popt)
-
-        SST = np.sum((y - np.mean(y))**2)
-        SSE = np.sum((y - fitted_y)**2)
-        R_squared = 1 - (SSE / SST)
-
-        fig = plt.figure(figsize=(6,5))
-        gs = gridspec.GridSpec(1,1)
-        ax1 = fig.add_subplot(gs[0])
-        plt.scatter(x, y, label='Data')
-        ax1.plot(x, fitted_y, '--', color ='red', label ="Model fitting")
-        ax1.set_xscale('log')
-        ax1.set_yscale('log')
-        ax1.set_xlabel("Shear stress [Pa]",family="serif",  fontsize=12)
-        ax1.set_ylabel("Viscosity [Pa.s]",family="serif",  fontsize=12)
-        ax1.tick_params(axis='both',which='major', direction="out", top="on", right="on", bottom="on", length=8, labelsize=8)
-        ax1.tick_params(axis='both',which='minor', direction="out", top="on", right="on", bottom="on", length=5, labelsize=8)
-
-        plt.text(min(x),min(y)*2,'Newtonian viscosity={:.3f}\nInfinite viscosity={:.3f}\nConsistency={:.3f}\nPower law index={:.3f}\nRsqr={:.3f}'.format\
-                (popt[0], popt[1], popt[2], popt[3], R_squared)) 
-
-        plt.legend()
-        fig.tight_layout()
-        fig.savefig("fitted_data.png", format="png",dpi=300, bbox_inches='tight')
-        plt.show()
-
-    def FitCrossModel(self, x, y, μo=3354.07, μf=42.2583, λ=2.68884e-5, n=0.902192):
-        bounds = ([min(y), 0, -np.inf, 0], [max(y), np.inf, np.inf, 1])
-        popt, pcov = optimize.curve_fit(self.CrossModel, x, y, p0=[μo , μf, λ, n])
-        fitted_y=self.CrossModel(x, *popt)
-
-        SST = np.sum((y - np.mean(y))**2)
-        SSE = np.sum((y - fitted_y)**2)
-        R_squared = 1 - (SSE / SST)
-
-        fig = plt.figure(figsize=(6,5))
-        gs = gridspec.GridSpec(1,1)
-        ax1 = fig.add_subplot(gs[0])
-        plt.scatter(x, y, label='Data')
-        ax1.plot(x, fitted_y, '--', color ='red', label ="Model fitting")
-        ax1.set_xscale('log')
-        ax1.set_yscale('log')
-        ax1.set_xlabel("Shear rate [1/s]",family="serif",  fontsize=12)
-        ax1.set_ylabel("Viscosity [Pa.s]",family="serif",  fontsize=12)
-        ax1.tick_params(axis='both',which='major', direction="out", top="on", right="on", bottom="on", length=8, labelsize=8)
-        ax1.tick_params(axis='both',which='minor', direction="out", top="on", right="on", bottom="on", length=5, labelsize=8)
-
-        plt.text(min(x),min(y)*2,'Zero shear viscosity={:.3f}\nInfinite viscosity={:.3f}\nConsistency={:.3f}\nPower law index={:.3f}\nRsqr={:.3f}'.format\
-                (popt[0], popt[1], popt[2], popt[3], R_squared)) 
-
-        plt.legend()
-        fig.tight_layout()
-        fig.savefig("fitted_data.png", format="png",dpi=300, bbox_inches='tight')
-        plt.show()
-
-    def FitCarreauYasudaModel(self, x, y, μo=3354.07, μf=42.2583, λ=2.68884e-5, a=0.902192, n=-1945.61):
-        initial_guess = [μo , μf, λ, a, n]         
-        bounds = [(-np.inf, np.inf), (y[-1], np.inf), (-np.inf, np.inf), (-np.inf, np.inf), (-np.inf, np.inf)]
-        result = optimize.minimize(self.CarreauYasudaModel, initial_guess, args=(x, y), bounds=bounds)
-        opt_params = result.x 
-        eta_0, eta_inf, lbda, a, n = opt_params
-        fitted_y = eta_inf + (eta_0 - eta_inf) * (1 + (lbda * x) ** a) ** ((n - 1) / a)
-        y_mean = np.mean(y)
-
-        SST = np.sum((y - np.mean(y))**2)
-        SSE = np.sum((y - fitted_y)**2)
-        R_squared = 1 - (SSE / SST)
-
-        fig = plt.figure(figsize=(6,5))
-        gs = gridspec.GridSpec(1,1)
-        ax1 = fig.add_subplot(gs[0])
-        plt.scatter(x, y, label='Data')
-        ax1.plot(x, fitted_y, '--', color ='red', label ="Model fitting")
-        ax1.set_xscale('log')
-        ax1.set_yscale('log')
-        ax1.set_xlabel("Shear rate [1/s]",family="serif",  fontsize=12)
-        ax1.set_ylabel("Viscosity [Pa.s]",family="serif",  fontsize=12)
-        ax1.tick_params(axis='both',which='major', direction="out", top="on", right="on", bottom="on", length=8, labelsize=8)
-        ax1.tick_params(axis='both',which='minor', direction="out", top="on", right="on", bottom="on", length=5, labelsize=8)
-        plt.text(min(x),min(y)*2,'Zero shear viscosity={:.3f}\nInfinite viscosity={:.3f}\nConsistency={:.3f}\nTransition parameter={:.3f}\nPower law index={:.3f}\nRsqr={:.3f}'.format\
-                (eta_0, eta_inf, lbda, a, n, R_squared))
-
-        plt.legend()
-        fig.tight_layout()
-        fig.savefig("fitted_data.png", format="png",dpi=300, bbox_inches='tight')
-        plt.show()
-
-    def FitPowerLawModel(self, x, y, k=1, n=1):
-        initial_guess = [k, n]  # Initial guesses for K and n
-        bounds = [(-np.inf, np.inf), (y[-1], np.inf)]
-        result = optimize.minimize(self.PowerLawModel, initial_guess, args=(x, y), bounds=None)
-        opt_params = result.x 
-        K_opt, n_opt = opt_params
-        fitted_y = K_opt * x**(n_opt - 1.0)
-
-        y_mean = np.mean(y)
-        SST = np.sum((y - y_mean)**2)
-        SSE = np.sum((y - fitted_y)**2)
-        R_squared = 1 - (SSE / SST)
-
-        fig = plt.figure(figsize=(6,5))
-        gs = gridspec.GridSpec(1,1)
-        ax1 = fig.add_subplot(gs[0])
-
-        plt.scatter(x, y, label='Data')
-        ax1.plot(x, fitted_y, '--', color ='red', label ="Model fitting")
-
-        ax1.set_xscale('log')
-        ax1.set_yscale('log')
-        ax1.set_xlabel("Shear rate [1/s]",family="serif",  fontsize=12)
-        ax1.set_ylabel("Viscosity [Pa.s]",family="serif",  fontsize=12)
-        ax1.tick_params(axis='both',which='major', direction="out", top="on", right="on", bottom="on", length=8, labelsize=8)
-        ax1.tick_params(axis='both',which='minor', direction="out", top="on", right="on", bottom="on", length=5, labelsize=8)
-        plt.text(min(x),min(y)*2,"Consistency={:.3f}\nPower law index={:.3f}\nRsqr={:.3f}\n".format(K_opt, n_opt, R_squared))
-        plt.legend()
-        fig.tight_layout()
-        fig.savefig("fitted_data.png", format="png",dpi=300, bbox_inches='tight')
-        plt.show()
-
-    def FitBinghamModel(self, x, y, τ=2.0, μo=1.0):
-        popt, pcov = optimize.curve_fit(self.BinghamModel, x, y, p0=[τ , μo])
-        fitted_y=self.BinghamModel(x, *popt)
-        SST = np.sum((y - np.mean(y))**2)
-        SSE = np.sum((y - fitted_y)**2)
-        R_squared = 1 - (SSE / SST)
-
-        fig = plt.figure(figsize=(6,5))
-        gs = gridspec.GridSpec(1,1)
-        ax1 = fig.add_subplot(gs[0])
-        plt.scatter(x, y, label='Data')
-        ax1.plot(x, fitted_y, '--', color ='red', label ="Model fitting")
-        ax1.set_xscale('linear')
-        ax1.set_yscale('linear')
-        ax1.set_xlabel("Shear rate [1/s]",family="serif",  fontsize=12)
-        ax1.set_ylabel("Shear stress [Pa]",family="serif",  fontsize=12)
-        ax1.tick_params(axis='both',which='major', direction="out", top="on", right="on", bottom="on", length=8, labelsize=8)
-        ax1.tick_params(axis='both',which='minor', direction="out", top="on", right="on", bottom="on", length=5, labelsize=8)
-        plt.text(max(x)/2,min(y)*2,'Yield stress={:.3f}\nPlastic viscosity={:.3f}\nRsqr={:.3f}'.format(popt[0], popt[1], R_squared))
-
-        plt.legend()
-        fig.tight_layout()
-        fig.savefig("fitted_data.png", format="png",dpi=300, bbox_inches='tight')
-        plt.show()
-
-    def FitHerschelBulkleyModel(self, x, y, τo=1.0, k=1.0, n=0.5): 
-        bounds = ([0.5, -np.inf, -np.inf], [np.inf, np.inf, np.inf])             
-        popt, pcov = optimize.curve_fit(self.HerschelBulkleyModel, list(x), list(y), p0=[τo, k, n], bounds=bounds)
-        fitted_y=self.HerschelBulkleyModel(x, *popt)
-        SST = np.sum((y - np.mean(y))**2)
-        SSE = np.sum((y - fitted_y)**2)
-        R_squared = 1 - (SSE / SST)
-
-        fig = plt.figure(figsize=(6,5))
-        gs = gridspec.GridSpec(1,1)
-        ax1 = fig.add_subplot(gs[0])
-        plt.scatter(x, y, label='Data')
-        ax1.plot(x, fitted_y, '--', color ='red', label ="Model fitting")
-        ax1.set_xscale('linear')
-        ax1.set_yscale('linear')
-        ax1.set_xlabel("Shear rate [1/s]",family="serif",  fontsize=12)
-        ax1.set_ylabel("Shear stress [Pa]",family="serif",  fontsize=12)
-        ax1.tick_params(axis='both',which='major', direction="out", top="on", right="on", bottom="on", length=8, labelsize=8)
-        ax1.tick_params(axis='both',which='minor', direction="out", top="on", right="on", bottom="on", length=5, labelsize=8)
-        plt.text(max(x)/2,min(y)*2,'Yield stress={:.3f}\nConsistency={:.3f}\nFlow index={:.3f}\nRsqr={:.3f}'.format(popt[0], popt[1], popt[2], R_squared))
-
-        plt.legend()
-        fig.tight_layout()
-        fig.savefig("fitted_data.png", format="png",dpi=300, bbox_inches='tight')
-        plt.show()
-
-    def FitCassonModel(self, x, y, τo=1, μo=1):
-        bounds = ([-np.inf, 0.0], [(max(y)), np.inf])
-        popt, pcov = optimize.curve_fit(self.CassonModel, x, y, p0=[τo, μo])
-        fitted_y=self.CassonModel(x, *popt)
-        SST = np.sum((y - np.mean(y))**2)
-        SSE = np.sum((y - fitted_y)**2)
-        R_squared = 1 - (SSE / SST)
-
-        fig = plt.figure(figsize=(6,5))
-        gs = gridspec.GridSpec(1,1)
-        ax1 = fig.add_subplot(gs[0])
-        plt.scatter(x, y, label='Data')
-        ax1.plot(x, fitted_y, '--', color ='red', label ="Model fitting")
-        ax1.set_xscale('linear')
-        ax1.set_yscale('linear')
-        ax1.set_xlabel("Shear rate [1/s]",family="serif",  fontsize=12)
-        ax1.set_ylabel("Shear stress [Pa]",family="serif",  fontsize=12)
-        ax1.tick_params(axis='both',which='major', direction="out", top="on", right="on", bottom="on", length=8, labelsize=8)
-        ax1.tick_params(axis='both',which='minor', direction="out", top="on", right="on", bottom="on", length=5, labelsize=8)
-        plt.text(max(x)/2,min(y)*2,'Yield stress={:.3f}\nCasson viscosity={:.3f}\nRsqr={:.3f}'.format(popt[0], popt[1], R_squared))
-
-        plt.legend()
-        fig.tight_layout()
-        fig.savefig("fitted_data.png", format="png",dpi=300, bbox_inches='tight')
-        plt.show()
+# the entry box that holds each parameter of the built-in models
+BOXES = {"μo": "zero_vis", "τo": "zero_vis", "τ": "zero_vis", "μf": "inf_vis",
+         "λ": "lamda", "K": "lamda", "k": "lamda", "a": "trans", "n": "pw_indx"}
 
 class GraphicalUserInterface(GeneralizedNeutonianFluidModels):
 
     def __init__(self):
 
-        self.shear_rate=[] 
-        self.viscosity=[]
-        self.default=False
+        self.dataset=None
+        self.pasted=(None, None)
+        # a bad initial guess stops the fit at its best point instead of freezing the window
+        self.budget={"max_time": 30.0}
         self.GUI = tk.Tk()
         self.width= self.GUI.winfo_screenwidth()
         self.height= self.GUI.winfo_screenheight()
@@ -403,17 +90,7 @@ class GraphicalUserInterface(GeneralizedNeutonianFluidModels):
 
         self.upload_btn = tk.Button(self.frame, text='Browse', width=7, font='none 12 bold',command=self.osPath, fg='black')
 
-        options = [ "PowellEyring",              
-                    "HerschelBulkley",
-                    "Carreau-Yasuda",
-                    "Williamson",
-                    "Power-Law",
-                    "Bingham", 
-                    "Casson",                                         
-                    "Cross",
-                    "Sisko",
-                    "Ellis",
-                  ]
+        options = list(GNF_MODELS)
 
         self.model = StringVar(self.frame)
         self.model.set("Select Model")
@@ -446,10 +123,6 @@ class GraphicalUserInterface(GeneralizedNeutonianFluidModels):
         self.pw_indx.grid(row=4, column=9, padx=0, pady=5, ipady=5,sticky=E)
         self.pw_indx_label.grid(row=4, column=9, padx=50, pady=5, ipady=0,sticky=E)
 
-        self.cons_indx   = tk.Text(self.frame, width=5, bg='#F5D0C7', height=1, wrap=WORD)
-        self.plaw_const  = tk.Text(self.frame, width=5, bg='#F5D0C7', height=1, wrap=WORD)
-        self.cons_indx_label   = tk.Label(self.frame, text='K=', width=2, font='none 11', bg='#50bfab' )
-        self.plaw_const_label  = tk.Label(self.frame, text='n=',  width=2, font='none 11',bg='#50bfab' )
 
         self.data_x_axis.bind("<Button-1>", lambda e: self.data_x_axis.delete(0.0, END))
         self.data_y_axis.bind("<Button-1>", lambda e: self.data_y_axis.delete(0.0, END))
@@ -485,73 +158,34 @@ class GraphicalUserInterface(GeneralizedNeutonianFluidModels):
             pass
         self.fitting_param(selected)
 
-    def open_popup(self):
+    def open_popup(self, message=None):
        self.pop= Toplevel(self.GUI)
        self.pop.geometry("300x100")
        self.pop.title("Report Window")
        Label(
-                self.pop,text="Optimization failed." 
+                self.pop,text=message or "Optimization failed." 
                 " Check your data or\nChange fitting parameters.",
-                font=('none 11 bold'),justify=LEFT).place(x=5,y=5
+                font=('none 11 bold'),justify=LEFT,wraplength=290).place(x=5,y=5
             )
 
     def fitting_param(self, model):
 
-        CarreauYasudaModel="Enter values for [μo, μf, λ, a, n] as \nthe zero shear viscosity, infinite \nviscosity, consistency, transition \nand power law index, respectively"
-
-        HerschelBulkleyModel="Enter values for [μo, λ, n] as the yield \nstress, consistency, and flow index,\n respectively"
-
-        BinghamModel="Enter values for [μo, μf] as the yield \nstress and plastic viscosity, respectively"
-
-        EllisModel="Enter values for [μo, μf, λ, n] as the zero \nshear viscosity, infinite viscosity, \nconsistency, and power law index, \nrespectively"
-
-        SiskoModel="Enter values for [μf, λ, n] as the infinite \nviscosity, consistency and power law \nindex, respectively"
-
-        PowerLawModel="Enter values for [λ, n] as the consistency \nand power law index, respectively"
-
-        WilliamsonModel="Enter values for [μo, λ, n] as the zero \nshear viscosity, consistency, and power \nlaw index, respectively"
-
-        CrossModel="Enter values for [μo, μf, λ, n] as the zero \nshear viscosity, infinite viscosity, \nconsistency, and power law index, \nrespectively"
-
-        CassonModel="Enter values for [μo, μf] as the Casson \nyield stress and Casson viscosity, \nrespectively"
-
-        PowellEyringModel="Enter values for [μo, μf, λ] as the zero \nshear viscosity, infinite viscosity, \n and consistency, \nrespectively"
-
-        if model == "HerschelBulkley":
-            msg=HerschelBulkleyModel
-
-        elif model=="Carreau-Yasuda":
-            msg=CarreauYasudaModel
-
-        elif model=="Bingham":
-            msg=BinghamModel
-
-        elif model=="Ellis":
-            msg=EllisModel
-
-        elif model=="Sisko":
-            msg=SiskoModel
-
-        elif model=="Power-Law":
-            msg=PowerLawModel
-
-        elif model=="Williamson":
-            msg=WilliamsonModel
-
-        elif model=="Cross":
-            msg=CrossModel
-
-        elif model=="Casson":
-            msg=CassonModel
-
-        elif model=="PowellEyring":
-            msg=PowellEyringModel
+        msg=GNF_MODELS[model].help
 
         self.pop= Toplevel(self.GUI)
         self.pop.geometry("300x100")
         self.pop.title("Parameters Window")
         Label(self.pop,text=msg, font=('none 11 bold'),justify=LEFT).place(x=5,y=5)
 
+    def ShowFit(self, result):
+        # the fit drew on its own figure and saved it; this window only shows it
+        window = Toplevel(self.GUI)
+        window.title("{} fit - {}".format(result["model"], result["output"]))
+        canvas = FigureCanvasTkAgg(result["figure"], master=window)
+        canvas.draw()
+        NavigationToolbar2Tk(canvas, window)
+        canvas.get_tk_widget().pack(fill="both", expand=True)
+
     def close_window(self):
         self.GUI.destroy()
         exit()
@@ -578,450 +212,71 @@ class GraphicalUserInterface(GeneralizedNeutonianFluidModels):
 
     def osPath(self):
 
-        self.shear_rate.clear() 
-        self.viscosity.clear()
-        self.cwd = os.getcwd()
-        os.path.filename = filedialog.askopenfilename(
-                                                    parent=self.GUI,initialdir=self.cwd,
+        self.dataset=None
+        filename = filedialog.askopenfilename(
+                                                    parent=self.GUI,initialdir=os.getcwd(),
                                                     title='Please select a directory',
                                                     filetypes=(("dat files", "*.dat"),("text files", "*.txt"),
                                                     ("csv files", "*.csv"),)
                                                    )
 
-        if os.path.filename:
+        if filename:
             self.upload_txtentry.delete(0,END)
-            self.upload_txtentry.insert(0,os.path.filename)
-            os.path.filename=self.upload_txtentry.get()
-            
-
-
-            try:
-                for i in np.loadtxt(os.path.filename):
-                    self.shear_rate.append(i[0])
-                    self.viscosity.append(i[1])
-
-            except:
-                try:
-                    for i in np.loadtxt(os.path.filename,skiprows=2):
-                        self.shear_rate.append(i[0])
-                        self.viscosity.append(i[1])
-                except:
-                    self.open_popup()
-
-    def PlotPowerLaw(self):
-
-        self.default=False
-
-        if self.shear_rate and self.viscosity:
-            self.x, self.y = np.array(self.shear_rate), np.array(self.viscosity)
-        else:
-            try:
-                x  = self.data_x_axis.get("1.0",'end-2c').rstrip()
-                y  = self.data_y_axis.get("1.0",'end-2c')
-                self.x = np.array([float(i) for i in x.split()])
-                self.y = np.array([float(i) for i in y.split()])
-            except:
-                self.open_popup()
-                return
-        try:
-            self.λ  = float(self.lamda.get("1.0",'end-1c'))
-        except:
-            self.λ = False
-        try:
-            self.n  = float(self.plaw_const.get("1.0",'end-1c'))
-        except:
-            self.n = False
-
-        if self.λ==0 or self.n==0:self.default=True
-
-        if self.default or any([self.λ, self.n]):
-            try:
-                self.FitPowerLawModel(self.x, self.y, self.λ, self.n)
-            except:
-                self.open_popup()
-        else:
-            try:
-                self.FitPowerLawModel(self.x, self.y)
-            except:
-                self.open_popup()
-
-    def PlotSisco(self):
-
-        self.default=False
-
-        if self.shear_rate and self.viscosity:
-            self.x, self.y = np.array(self.shear_rate), np.array(self.viscosity)
-        else:
-            try:
-                x  = self.data_x_axis.get("1.0",'end-2c').rstrip()
-                y  = self.data_y_axis.get("1.0",'end-2c')
-                self.x = np.array([float(i) for i in x.split()])
-                self.y = np.array([float(i) for i in y.split()])
-            except:
-                self.open_popup()
-                return
-        try:
-            self.μf = float(self.inf_vis.get("1.0",'end-1c'))
-        except:
-            self.μf = False
-        try:
-            self.λ  = float(self.lamda.get("1.0",'end-1c'))
-        except:
-            self.λ = False
-        try:
-            self.n  = float(self.plaw_const.get("1.0",'end-1c'))
-        except:
-            self.n = False
+            self.upload_txtentry.insert(0,filename)
 
-        if any(i == 0 for i in [self.μf, self.λ, self.n]):self.default=True
-
-        if self.default or any([self.μf, self.λ, self.n]):
             try:
-                self.FitSiskoModel(self.x, self.y, self.μf, self.λ, self.n)
-            except:
-                self.open_popup()
-        else:
+                self.dataset = Dataset.FromFile(filename)
+            except Exception as e:
+                self.open_popup(str(e) if isinstance(e, ValueError) else None)
+
+    def GetDataset(self):
+        # an uploaded file is used as it is; pasted text is parsed again only
+        # when it has changed since the last Submit
+        if self.dataset is not None:
+            return self.dataset
+        text = (self.data_x_axis.get("1.0",'end-1c'), self.data_y_axis.get("1.0",'end-1c'))
+        if text != self.pasted[0]:
             try:
-                self.FitSiskoModel(self.x, self.y)
-            except:
-                self.open_popup()
-
-    def PlotCross(self):
-
-        self.default=False
-
-        if self.shear_rate and self.viscosity:
-            self.x, self.y = np.array(self.shear_rate), np.array(self.viscosity)
-        else:
+                self.pasted = (text, Dataset.FromText(*text))
+            except ValueError as e:
+                self.pasted = (None, None)
+                self.open_popup(str(e))
+                return None
+        return self.pasted[1]
+
+    def ParameterBoxes(self, params):
+        # a parameter goes in the box labelled with its name, a yield stress in
+        # μo's box and a consistency in λ's (as the help of each model says);
+        # the others, or a box that is taken, get the first free box
+        free = ["zero_vis", "inf_vis", "lamda", "trans", "pw_indx"]
+        boxes = []
+        for name in params:
+            box = BOXES.get(name)
+            if box not in free:
+                box = free[0] if free else None
+            if box:
+                free.remove(box)
+            boxes.append(box and getattr(self, box))
+        return boxes
+
+    def PlotRegisteredModel(self, model):
+
+        data = self.GetDataset()
+        if data is None:
+            return
+        x, y = data.x, data.y
+
+        # an empty box keeps the seed of that parameter
+        p0 = []
+        for box in self.ParameterBoxes(GNF_MODELS[model].params):
             try:
-                x  = self.data_x_axis.get("1.0",'end-2c').rstrip()
-                y  = self.data_y_axis.get("1.0",'end-2c')
-                self.x = np.array([float(i) for i in x.split()])
-                self.y = np.array([float(i) for i in y.split()])
+                p0.append(float(box.get("1.0",'end-1c')))
             except:
-                self.open_popup()
-                return
-        try:
-            self.μo = float(self.zero_vis.get("1.0",'end-1c'))
-        except:
-            self.μo = False
-        try:
-            self.μf = float(self.inf_vis.get("1.0",'end-1c'))
-        except:
-            self.μf = False
-        try:
-            self.λ  = float(self.lamda.get("1.0",'end-1c'))
-        except:
-            self.λ = False
+                p0.append(None)
         try:
-            self.n  = float(self.pw_indx.get("1.0",'end-1c'))
+            self.ShowFit(self.FitRegisteredModel(model, x, y, p0, **self.budget))
         except:
-            self.n = False
-
-        if any(i == 0 for i in [self.μo, self.μf, self.λ, self.n]):self.default=True
-
-        if self.default or any([self.μo, self.μf, self.λ, self.n]):
-            try:
-                self.FitCrossModel(self.x, self.y, self.μo, self.μf, self.λ, self.n)
-            except:
-                self.open_popup()
-        else:
-            try:
-                self.FitCrossModel(self.x, self.y)
-            except:
-                self.open_popup()
-
-    def PlotPowellEyring(self):
-
-        self.default=False
-
-        if self.shear_rate and self.viscosity:
-            self.x, self.y = np.array(self.shear_rate), np.array(self.viscosity)
-        else:
-            try:
-                x  = self.data_x_axis.get("1.0",'end-2c').rstrip()
-                y  = self.data_y_axis.get("1.0",'end-2c')
-                self.x = np.array([float(i) for i in x.split()])
-                self.y = np.array([float(i) for i in y.split()])
-            except:
-                self.open_popup()
-                return
-        try:
-            self.μo = float(self.zero_vis.get("1.0",'end-1c'))
-        except:
-            self.μo = False
-        try:
-            self.μf = float(self.inf_vis.get("1.0",'end-1c'))
-        except:
-            self.μf = False
-        try:
-            self.λ  = float(self.lamda.get("1.0",'end-1c'))
-        except:
-            self.λ = False
-
-        if any(i == 0 for i in [self.μo, self.μf, self.λ]):self.default=True
-
-        if self.default or any([self.μo, self.μf, self.λ]):
-            try:
-                self.FitPowellEyringModel(self.x, self.y, self.μo, self.μf, self.λ)
-            except:
-                self.open_popup()
-        else:
-            try:
-                self.FitPowellEyringModel(self.x, self.y)
-            except:
-                self.open_popup()
-
-    def PlotEllis(self):
-
-        self.default=False
-
-        if self.shear_rate and self.viscosity:
-            self.x, self.y = np.array(self.shear_rate), np.array(self.viscosity)
-        else:
-            try:
-                x  = self.data_x_axis.get("1.0",'end-2c').rstrip()
-                y  = self.data_y_axis.get("1.0",'end-2c')
-                self.x = np.array([float(i) for i in x.split()])
-                self.y = np.array([float(i) for i in y.split()])
-            except:
-                self.open_popup()
-                return
-        try:
-            self.μo = float(self.zero_vis.get("1.0",'end-1c'))
-        except:
-            self.μo = False
-        try:
-            self.μf = float(self.inf_vis.get("1.0",'end-1c'))
-        except:
-            self.μf = False
-        try:
-            self.λ  = float(self.lamda.get("1.0",'end-1c'))
-        except:
-            self.λ = False
-        try:
-            self.n  = float(self.pw_indx.get("1.0",'end-1c'))
-        except:
-            self.n = False
-
-        if any(i == 0 for i in [self.μo, self.μf, self.λ, self.n]):self.default=True
-
-        if self.default or any([self.μo, self.μf, self.λ, self.n]):
-            try:
-                self.FitEllisModel(self.x, self.y, self.μo, self.μf, self.λ, self.n)
-            except:
-                self.open_popup()
-        else:
-            try:
-                self.FitEllisModel(self.x, self.y)
-            except:
-                self.open_popup()
-
-    def PlotWilliamson(self):
-
-        self.default=False
-
-        if self.shear_rate and self.viscosity:
-            self.x, self.y = np.array(self.shear_rate), np.array(self.viscosity)
-        else:
-            try:
-                x  = self.data_x_axis.get("1.0",'end-2c').rstrip()
-                y  = self.data_y_axis.get("1.0",'end-2c')
-                self.x = np.array([float(i) for i in x.split()])
-                self.y = np.array([float(i) for i in y.split()])
-            except:
-                self.open_popup()
-                return
-        try:
-            self.λ = float(self.cons_indx.get("1.0",'end-1c'))
-        except:
-            self.λ = False
-        try:
-            self.n  = float(self.plaw_const.get("1.0",'end-1c'))
-        except:
-            self.n = False
-        try:
-            self.μf = float(self.zero_vis.get("1.0",'end-1c'))
-        except:
-            self.μf = False
-
-        if any(i == 0 for i in [self.μf, self.λ, self.n]):self.default=True
-
-        if self.default or any([self.μf, self.λ, self.n]):
-            try:
-                self.FitWilliamsonModel(self.x, self.y, self.μf, self.λ, self.n)
-            except:
-                self.open_popup()
-        else:
-            try:
-                self.FitWilliamsonModel(self.x, self.y)
-            except:
-                self.open_popup()
-
-    def PlotCarreauYasuda(self):
-
-        self.default=False
-
-        if self.shear_rate and self.viscosity:
-            self.x, self.y = np.array(self.shear_rate), np.array(self.viscosity)
-        else:
-            try:
-                x  = self.data_x_axis.get("1.0",'end-2c').rstrip()
-                y  = self.data_y_axis.get("1.0",'end-2c')
-                self.x = np.array([float(i) for i in x.split()])
-                self.y = np.array([float(i) for i in y.split()])
-            except:
-                self.open_popup()
-                return
-        try:
-            self.μo = float(self.zero_vis.get("1.0",'end-1c'))
-        except:
-            self.μo = None
-        try:
-            self.μf = float(self.inf_vis.get("1.0",'end-1c'))
-        except:
-            self.μf = None
-        try:
-            self.λ  = float(self.lamda.get("1.0",'end-1c'))
-        except:
-            self.λ = None
-        try:
-            self.a  = float(self.trans.get("1.0",'end-1c'))
-        except:
-            self.a = None
-        try:
-            self.n  = float(self.pw_indx.get("1.0",'end-1c'))
-        except:
-            self.n = None
-
-        if any(i == 0 for i in [self.μo, self.μf, self.λ, self.a, self.n]):self.default=True
-
-        if self.default or any([self.μo, self.μf, self.λ, self.a, self.n]):
-            try:
-                self.FitCarreauYasudaModel(self.x, self.y, self.μo, self.μf, self.λ, self.a, self.n)
-            except:
-                self.open_popup()
-        else:
-            try:
-                self.FitCarreauYasudaModel(self.x, self.y)
-            except:
-                self.open_popup()
-
-    def PlotBingham(self):
-
-        self.default=False
-
-        if self.shear_rate and self.viscosity:
-            self.x, self.y = np.array(self.shear_rate), np.array(self.viscosity)
-        else:
-            try:
-                x  = self.data_x_axis.get("1.0",'end-2c').rstrip()
-                y  = self.data_y_axis.get("1.0",'end-2c')
-                self.x = np.array([float(i) for i in x.split()])
-                self.y = np.array([float(i) for i in y.split()])
-            except:
-                self.open_popup()
-                return
-        try:
-            self.μo = float(self.zero_vis.get("1.0",'end-1c'))
-        except:
-            self.μo = None
-        try:
-            self.μf = float(self.inf_vis.get("1.0",'end-1c'))
-        except:
-            self.μf = None
-
-        if self.μo==0 or self.μf==0:self.default=True
-
-        if self.default or any([self.μo, self.μf]):
-
-            try:
-                self.FitBinghamModel(self.x, self.y, self.μf, self.μo)
-            except:
-                self.open_popup()
-        else:
-            try:
-                self.FitBinghamModel(self.x, self.y)
-            except:
-                self.open_popup()
-
-    def PlotHerschelBulkley(self):
-
-        self.default=False
-
-        if self.shear_rate and self.viscosity:
-            self.x, self.y = np.array(self.shear_rate), np.array(self.viscosity)
-        else:
-            try:
-                x  = self.data_x_axis.get("1.0",'end-2c').rstrip()
-                y  = self.data_y_axis.get("1.0",'end-2c')
-                self.x = np.array([float(i) for i in x.split()])
-                self.y = np.array([float(i) for i in y.split()])
-            except:
-                self.open_popup()
-                return
-        try:
-            self.μo = float(self.zero_vis.get("1.0",'end-1c'))
-        except:
-            self.μo = None
-        try:
-            self.λ  = float(self.lamda.get("1.0",'end-1c'))
-        except:
-            self.λ = None
-        try:
-            self.n  = float(self.pw_indx.get("1.0",'end-1c'))
-        except:
-            self.n = None
-
-        if self.μo==0 or self.λ==0 or self.n==0:self.default=True
-
-        if self.default or any([self.μo, self.λ, self.n]):
-            try:
-                self.FitHerschelBulkleyModel(self.x, self.y, self.μo, self.λ, self.n)
-            except:
-                self.open_popup()
-        else:
-            try:
-                self.FitHerschelBulkleyModel(self.x, self.y)
-            except:
-                self.open_popup()
-
-    def PlotCasson(self):
-
-        self.default=False
-
-        if self.shear_rate and self.viscosity:
-            self.x, self.y = np.array(self.shear_rate), np.array(self.viscosity)
-        else:
-            try:
-                x  = self.data_x_axis.get("1.0",'end-2c').rstrip()
-                y  = self.data_y_axis.get("1.0",'end-2c')
-                self.x = np.array([float(i) for i in x.split()])
-                self.y = np.array([float(i) for i in y.split()])
-            except:
-                self.open_popup()
-                return
-        try:
-            self.k = float(self.cons_indx.get("1.0",'end-1c'))
-        except:
-            self.k = False
-        try:
-            self.n  = float(self.plaw_const.get("1.0",'end-1c'))
-        except:
-            self.n = False
-
-        if self.k==0 or self.n==0:self.default=True
-
-        if self.default or any([self.k, self.n]):
-            try:
-                self.FitCassonModel(self.x, self.y, self.k, self.n)
-            except:
-                self.open_popup()
-        else:
-            try:
-                self.FitCassonModel(self.x, self.y)
-            except:
-                self.open_popup()
+            self.open_popup()
 
     def PlotData(self):
 
@@ -1031,36 +286,8 @@ class GraphicalUserInterface(GeneralizedNeutonianFluidModels):
             pass
             
         model= self.model.get()
-
-        if model=="Power-Law":
-            self.PlotPowerLaw()
-
-        elif model=="Williamson":
-            self.PlotWilliamson()
-
-        elif model=="Cross":
-            self.PlotCross()
-
-        elif model=="Sisko":
-            self.PlotSisco()
-
-        elif model=="Carreau-Yasuda":
-            self.PlotCarreauYasuda()
-
-        elif model=="Ellis":
-            self.PlotEllis()
-
-        elif model=="HerschelBulkley":
-            self.PlotHerschelBulkley()
-
-        elif model=="Bingham":
-            self.PlotBingham()
-
-        elif model=="Casson":
-            self.PlotCasson()
-
-        elif model=="PowellEyring":
-            self.PlotPowellEyring()
+        if model in GNF_MODELS:
+            self.PlotRegisteredModel(model)
 
 if __name__ == "__main__":
 
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+__doc__ = """
+
+This module has the function(s) that is used to
+
+evaluate the GNF Models for many parameter sets
+
+over a grid of shear rates in one call.
+
+"""
+
+__author__     = "Osita Sunday Nnyigide"
+
+__copyright__  = "Copyright 2022, Osita Sunday Nnyigide"
+
+__credits__    = ["Hyun Kyu"]
+
+__license__    = "MIT"
+
+__version__    = "1.0.0"
+
+__maintainer__ = "Osita Sunday Nnyigide"
+
+__email__      = "osita@protein-science.com"
+
+__status__     = "Production"
+
+__date__       = "November 22, 2023"
+
+import numpy as np
+
+from GNFModels import GeneralizedNeutonianFluidModels, GNF_MODELS
+from Dataset import StorageType
+
+import warnings
+warnings.filterwarnings("ignore")
+
+class ModelPrediction(GeneralizedNeutonianFluidModels):
+
+    def __init__(self, chunk_bytes=64 * 2**20):
+        self.chunk_bytes = chunk_bytes
+
+    def Predict(self, model, params, x, quantity=None, dtype=np.float64, out=None):
+        """
+        Evaluate `model` for every row of `params` (n_param_sets x n_params, or a
+        single parameter set) at every value of `x` and return an
+        (n_param_sets x len(x)) array of viscosity or stress. Rows are
+        evaluated in chunks so that the temporaries stay below `chunk_bytes`;
+        `out` may be a preallocated array or np.memmap of the result shape.
+        Every chunk is evaluated in float64 and only stored as `dtype`, so
+        float32 halves the memory of the result at a relative error of 6e-8;
+        values outside the float32 range (about 1e-38 to 3e38) become 0 or inf.
+        """
+        spec = GNF_MODELS[model]
+        kernel = spec.kernel
+        quantity = quantity or spec.output
+        if quantity not in ("viscosity", "stress"):
+            raise ValueError("quantity must be 'viscosity' or 'stress', not {!r}".format(quantity))
+        if quantity != spec.output and spec.x != "shear rate":
+            raise ValueError("{} is a function of {}; only {} can be predicted".format(model, spec.x, spec.output))
+
+        params = np.atleast_2d(np.asarray(params, dtype=np.float64))
+        x = np.ravel(np.asarray(x, dtype=np.float64))
+        if params.shape[1] != len(spec.params):
+            raise ValueError("{} takes {} parameters {}, got {}".format(
+                             model, len(spec.params), spec.params, params.shape[1]))
+
+        if out is None:
+            out = np.empty((params.shape[0], x.size), dtype=StorageType(dtype))
+        elif out.shape != (params.shape[0], x.size):
+            raise ValueError("out has shape {}, expected {}".format(out.shape, (params.shape[0], x.size)))
+
+        # the nested power models build a few temporaries of the chunk's size
+        rows = max(1, int(self.chunk_bytes // (8 * 4 * max(x.size, 1))))
+        row_x = x[np.newaxis, :]
+        for start in range(0, params.shape[0], rows):
+            columns = params[start:start + rows].T[:, :, np.newaxis]
+            values = kernel(row_x, *columns)
+            if quantity != spec.output:
+                values = values * row_x if quantity == "stress" else values / row_x
+            out[start:start + rows] = values
+        return out
+
+    def PredictViscosity(self, model, params, x, **kwargs):
+        return self.Predict(model, params, x, quantity="viscosity", **kwargs)
+
+    def PredictStress(self, model, params, x, **kwargs):
+        return self.Predict(model, params, x, quantity="stress", **kwargs)
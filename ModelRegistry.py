@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+
+__doc__ = """
+
+This module has the registry of the GNF Models.
+
+Each model is a declarative spec (expression, parameters,
+
+units, bounds, seeding rule and axis type) whose expression
+
+is compiled once into a vectorized NumPy kernel and a
+
+complex-step Jacobian. User models are read from models.json.
+
+"""
+
+__author__     = "Osita Sunday Nnyigide"
+
+__copyright__  = "Copyright 2022, Osita Sunday Nnyigide"
+
+__credits__    = ["Hyun Kyu"]
+
+__license__    = "MIT"
+
+__version__    = "1.0.0"
+
+__maintainer__ = "Osita Sunday Nnyigide"
+
+__email__      = "osita@protein-science.com"
+
+__status__     = "Production"
+
+__date__       = "November 22, 2023"
+
+import os
+import ast
+import json
+import functools
+import numpy as np
+
+# functions an expression may call; all of them accept complex arguments so
+# that the Jacobian can be taken by complex step
+FUNCTIONS = {name: getattr(np, name) for name in
+             ["sqrt", "exp", "log", "log10", "sin", "cos", "tan", "sinh", "cosh", "tanh",
+              "arcsinh", "arccosh", "arctanh", "arctan"]}
+NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load, ast.Constant,
+         ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub, ast.UAdd)
+STEP = 1e-30
+
+# seeds and bounds may also index the data, e.g. y[-1] or y[:5], and use these
+RULE_NODES = NODES + (ast.Subscript, ast.Slice)
+RULE_NAMES = dict(FUNCTIONS, inf=np.inf, min=np.min, max=np.max, mean=np.mean, median=np.median)
+
+@functools.lru_cache(maxsize=None)
+def CompileRule(rule):
+    """
+    Compile a seed or bound expression in the data x and y, allowing the
+    nodes of a model expression plus indexing and slicing only.
+    """
+    tree = ast.parse(rule, mode="eval")
+    for node in ast.walk(tree):
+        if not isinstance(node, RULE_NODES):
+            raise ValueError("{!r} is not allowed in a seed or bound".format(type(node).__name__))
+        if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in RULE_NAMES):
+            raise ValueError("only {} may be called in a seed or bound".format(sorted(RULE_NAMES)))
+        if isinstance(node, ast.Name) and node.id not in RULE_NAMES and node.id not in ("x", "y"):
+            raise ValueError("unknown name {!r} in {!r}".format(node.id, rule))
+    return compile(tree, "<{}>".format(rule), "eval")
+
+@functools.lru_cache(maxsize=None)
+def CompileExpression(expression, params, variables=("x",)):
+    """
+    Compile `expression` in `variables` and `params` into a kernel f(x, *params)
+    and its Jacobian J(x, *params) of shape (len(params),) + broadcast shape.
+    """
+    tree = ast.parse(expression, mode="eval")
+    for node in ast.walk(tree):
+        if not isinstance(node, NODES):
+            raise ValueError("{!r} is not allowed in a model expression".format(type(node).__name__))
+        if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS):
+            raise ValueError("only {} may be called in a model expression".format(sorted(FUNCTIONS)))
+        if isinstance(node, ast.Name) and node.id not in FUNCTIONS and node.id not in params + variables:
+            raise ValueError("unknown name {!r} in {!r}".format(node.id, expression))
+
+    code = compile(tree, "<{}>".format(expression), "eval")
+    arguments = variables + params
+
+    def kernel(*values):
+        return eval(code, {"__builtins__": {}}, dict(FUNCTIONS, **dict(zip(arguments, values))))
+
+    def jacobian(x, *values):
+        # give every parameter a leading axis on which entry k carries the complex
+        # step of parameter k, so one evaluation gives all the partial derivatives
+        n = len(values)
+        values = [np.asarray(v, dtype=np.float64) for v in values]
+        shape = np.broadcast(x, *values).shape
+        steps = 1j * STEP * np.eye(n).reshape((n, n) + (1,) * len(shape))
+        with np.errstate(all="ignore"):
+            result = kernel(x, *[v + steps[k] for k, v in enumerate(values)]).imag / STEP
+        if result.shape != (n,) + shape:
+            result = np.broadcast_to(result, (n,) + shape).copy()
+        return result
+
+    return kernel, jacobian
+
+class ModelSpec:
+
+    __slots__ = ("name", "expression", "params", "p0", "bounds", "units", "labels", "seed",
+                 "positive", "output", "x", "solver", "help", "kernel", "jacobian")
+
+    def __init__(self, name, expression, params, p0, units=None, labels=None, bounds=None,
+                 seed=None, positive=None, output="viscosity", x="shear rate", solver="curve_fit", help=None):
+        if output not in ("viscosity", "stress"):
+            raise ValueError("output of {} must be 'viscosity' or 'stress'".format(name))
+        if len(p0) != len(params):
+            raise ValueError("{} has {} parameters but {} initial values".format(name, len(params), len(p0)))
+        self.name = name
+        self.expression = expression
+        self.params = list(params)
+        self.p0 = [float(p) for p in p0]
+        self.units = list(units or [""] * len(params))
+        self.labels = list(labels or params)
+        # bounds and seeds are numbers or expressions in the data x and y
+        self.bounds = bounds
+        self.seed = seed or {}
+        # parameters that are positive by definition, fitted as log(p) with log/relative residuals
+        self.positive = list(positive or [])
+        self.output = output
+        self.x = x
+        self.solver = solver
+        self.help = help or "Enter values for [{}] as the \n{}, respectively".format(
+                            ", ".join(self.params), ", ".join(self.labels).lower())
+        self.kernel, self.jacobian = CompileExpression(expression, tuple(self.params))
+        for rule in list(self.seed.values()) + [b for side in (bounds or []) for b in side]:
+            if isinstance(rule, str):
+                CompileRule(rule)
+
+    @property
+    def scale(self):
+        return "log" if self.output == "viscosity" else "linear"
+
+    def Evaluate(self, rule, x, y):
+        if isinstance(rule, str):
+            return float(eval(CompileRule(rule), {"__builtins__": {}}, dict(RULE_NAMES, x=x, y=y)))
+        return float(rule)
+
+    def Seed(self, x, y):
+        return [self.Evaluate(self.seed.get(name, p), x, y) for name, p in zip(self.params, self.p0)]
+
+    def Bounds(self, x, y):
+        if self.bounds is None:
+            return None
+        return [[self.Evaluate(b, x, y) for b in side] for side in self.bounds]
+
+    def ToDict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name not in ("kernel", "jacobian")}
+
+GNF_MODELS = {}
+
+def RegisterModel(spec=None, **kwargs):
+    spec = spec or ModelSpec(**kwargs)
+    GNF_MODELS[spec.name] = spec
+    return spec
+
+def LoadModels(filename):
+    with open(filename) as f:
+        return [RegisterModel(**entry) for entry in json.load(f)]
+
+RegisterModel(name="PowellEyring", expression="μf + (μo - μf) * arcsinh(λ*x) / (λ*x)",
+              params=["μo", "μf", "λ"], p0=[3354.07, 42.2583, 2.68884e-5], units=["Pa.s", "Pa.s", "s"],
+              labels=["Newtonian viscosity", "Infinite viscosity", "Consistency"],
+              positive=["μo", "λ"],
+              help="Enter values for [μo, μf, λ] as the zero \nshear viscosity, infinite viscosity, \n and consistency, \nrespectively")
+RegisterModel(name="HerschelBulkley", expression="τo + k * x**n",
+              params=["τo", "k", "n"], p0=[1.0, 1.0, 0.5], units=["Pa", "Pa.s^n", "-"],
+              labels=["Yield stress", "Consistency", "Flow index"], output="stress",
+              bounds=[[0.5, "-inf", "-inf"], ["inf", "inf", "inf"]],
+              positive=["k"],
+              help="Enter values for [μo, λ, n] as the yield \nstress, consistency, and flow index,\n respectively")
+RegisterModel(name="Carreau-Yasuda", expression="μf + (μo - μf) * (1 + (λ*x)**a) ** ((n - 1) / a)",
+              params=["μo", "μf", "λ", "a", "n"], p0=[3354.07, 42.2583, 2.68884e-5, 0.902192, -1945.61],
+              units=["Pa.s", "Pa.s", "s", "-", "-"],
+              labels=["Zero shear viscosity", "Infinite viscosity", "Consistency", "Transition parameter", "Power law index"],
+              bounds=[["-inf", "y[-1]", "-inf", "-inf", "-inf"], ["inf"] * 5], solver="minimize",
+              positive=["μo", "λ", "a"],
+              help="Enter values for [μo, μf, λ, a, n] as \nthe zero shear viscosity, infinite \nviscosity, consistency, transition \nand power law index, respectively")
+RegisterModel(name="Williamson", expression="μo / (1 + (λ*x)**n)",
+              params=["μo", "λ", "n"], p0=[3354.07, 2.68884e-5, -1945.61], units=["Pa.s", "s", "-"],
+              labels=["Infinite viscosity", "Consistency", "Power law index"],
+              positive=["μo"],
+              help="Enter values for [μo, λ, n] as the zero \nshear viscosity, consistency, and power \nlaw index, respectively")
+RegisterModel(name="Power-Law", expression="K * x**(n - 1)",
+              params=["K", "n"], p0=[1.0, 1.0], units=["Pa.s^n", "-"],
+              labels=["Consistency", "Power law index"], solver="minimize",
+              positive=["K"],
+              help="Enter values for [λ, n] as the consistency \nand power law index, respectively")
+RegisterModel(name="Bingham", expression="τo + μo * x",
+              params=["τo", "μo"], p0=[2.0, 1.0], units=["Pa", "Pa.s"],
+              labels=["Yield stress", "Plastic viscosity"], output="stress",
+              positive=["μo"],
+              help="Enter values for [μo, μf] as the yield \nstress and plastic viscosity, respectively")
+RegisterModel(name="Casson", expression="sqrt(τo) + sqrt(μo * x)",
+              params=["τo", "μo"], p0=[1.0, 1.0], units=["Pa", "Pa.s"],
+              labels=["Yield stress", "Casson viscosity"], output="stress",
+              positive=["μo"],
+              help="Enter values for [μo, μf] as the Casson \nyield stress and Casson viscosity, \nrespectively")
+RegisterModel(name="Cross", expression="μf + (μo - μf) / (1 + (λ*x)**n)",
+              params=["μo", "μf", "λ", "n"], p0=[3354.07, 42.2583, 2.68884e-5, 0.902192],
+              units=["Pa.s", "Pa.s", "s", "-"],
+              labels=["Zero shear viscosity", "Infinite viscosity", "Consistency", "Power law index"],
+              positive=["μo", "λ"],
+              help="Enter values for [μo, μf, λ, n] as the zero \nshear viscosity, infinite viscosity, \nconsistency, and power law index, \nrespectively")
+RegisterModel(name="Sisko", expression="μf + λ * (x**n - 1)",
+              params=["μf", "λ", "n"], p0=[42.2583, 2.68884e-5, 1.0], units=["Pa.s", "Pa.s^n", "-"],
+              labels=["Infinite viscosity", "Consistency", "Power law index"],
+              positive=["λ"],
+              help="Enter values for [μf, λ, n] as the infinite \nviscosity, consistency and power law \nindex, respectively")
+RegisterModel(name="Ellis", expression="μf + (μo - μf) / (1 + (λ*x)**n)",
+              params=["μo", "μf", "λ", "n"], p0=[3354.07, 42.2583, 2.68884e-5, 0.902192],
+              units=["Pa.s", "Pa.s", "1/Pa", "-"], x="shear stress",
+              labels=["Newtonian viscosity", "Infinite viscosity", "Consistency", "Power law index"],
+              positive=["μo", "λ"],
+              help="Enter values for [μo, μf, λ, n] as the zero \nshear viscosity, infinite viscosity, \nconsistency, and power law index, \nrespectively")
+
+# user models, one JSON list of ModelSpec fields, next to the program or at $GNF_MODELS_FILE
+USER_MODELS = os.environ.get("GNF_MODELS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models.json"))
+if os.path.exists(USER_MODELS):
+    LoadModels(USER_MODELS)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+__doc__ = """
+
+This module has the function(s) that is used to
+
+fit a GNF Model from many initial guesses at once,
+
+and to put bootstrap confidence intervals on its
+
+parameters, on a pool of worker processes that all
+
+read the dataset from shared memory.
+
+"""
+
+__author__     = "Osita Sunday Nnyigide"
+
+__copyright__  = "Copyright 2022, Osita Sunday Nnyigide"
+
+__credits__    = ["Hyun Kyu"]
+
+__license__    = "MIT"
+
+__version__    = "1.0.0"
+
+__maintainer__ = "Osita Sunday Nnyigide"
+
+__email__      = "osita@protein-science.com"
+
+__status__     = "Production"
+
+__date__       = "November 22, 2023"
+
+import os
+import sys
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from GNFModels import GeneralizedNeutonianFluidModels, GNF_MODELS
+from SharedData import SharedArrays, Attached
+from Dataset import Dataset, StorageType
+
+import warnings
+warnings.filterwarnings("ignore")
+
+def FitStart(job):
+    model, data, p0, budget = job
+    with Attached(*data) as (x, y):
+        try:
+            return GeneralizedNeutonianFluidModels().FitModel(model, x, y, p0, **budget)
+        except Exception as e:
+            return {"model": model, "p0": list(p0), "error": "{}: {}".format(type(e).__name__, e)}
+
+def FitResample(job):
+    model, data, p0, seed, budget = job
+    with Attached(*data) as (x, y):
+        rows = np.random.default_rng(seed).integers(0, x.size, x.size)
+        try:
+            return GeneralizedNeutonianFluidModels().FitModel(model, x[rows], y[rows], p0, **budget)
+        except Exception as e:
+            return {"model": model, "error": "{}: {}".format(type(e).__name__, e)}
+
+def Transport(x, y, transport, shared):
+    """
+    What each job carries for the dataset: handles into `shared` memory,
+    or the arrays themselves to be pickled with every job.
+    """
+    if transport == "shared":
+        return tuple(shared.Share(x, y))
+    if transport == "pickle":
+        return (x, y)
+    raise ValueError("transport must be 'shared' or 'pickle', not {!r}".format(transport))
+
+def RunJobs(function, jobs, workers=None):
+    if workers == 1:
+        return [function(job) for job in jobs]
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+def Starts(model, x, y, starts=16, spread=10.0, seed=0):
+    """
+    The default seed of `model` and `starts` - 1 guesses around it, every
+    parameter scaled by a log-uniform factor in [1/spread, spread].
+    """
+    p0 = np.asarray(GNF_MODELS[model].Seed(x, y), dtype=float)
+    factors = np.exp(np.random.default_rng(seed).uniform(-np.log(spread), np.log(spread), (starts - 1, p0.size)))
+    return [p0] + list(p0 * factors)
+
+def FitStarts(model, x, y, starts=16, spread=10.0, workers=None, transport="shared", seed=0, dtype=np.float64, **budget):
+    """
+    Fit `model` from every guess of Starts on `workers` processes and return
+    the fit with the lowest SSE, with "starts" holding every fit. The
+    workers get the data as `dtype`; float32 halves what is shared.
+    """
+    x, y = np.asarray(x, dtype=StorageType(dtype)), np.asarray(y, dtype=StorageType(dtype))
+    with SharedArrays() as shared:
+        data = Transport(x, y, transport, shared)
+        results = RunJobs(FitStart, [(model, data, p0, budget) for p0 in Starts(model, x, y, starts, spread, seed)], workers)
+    fitted = [result for result in results if "error" not in result]
+    if not fitted:
+        raise RuntimeError("no start converged: {}".format(results[0]["error"]))
+    return dict(min(fitted, key=lambda result: result["sse"]), starts=results)
+
+def Bootstrap(model, x, y, samples=200, p0=None, confidence=0.95, workers=None, transport="shared", seed=0,
+              dtype=np.float64, **budget):
+    """
+    Refit `model` to `samples` resamplings (with replacement) of the data,
+    each started from the fit to all the data, and return the percentile
+    confidence interval of every parameter.
+    """
+    x, y = np.asarray(x, dtype=StorageType(dtype)), np.asarray(y, dtype=StorageType(dtype))
+    best = GeneralizedNeutonianFluidModels().FitModel(model, x, y, p0, **budget)
+    with SharedArrays() as shared:
+        data = Transport(x, y, transport, shared)
+        results = RunJobs(FitResample, [(model, data, best["params"], seed + k, budget) for k in range(samples)], workers)
+    params = np.array([result["params"] for result in results if "error" not in result])
+    if not len(params):
+        raise RuntimeError("no resampled fit converged: {}".format(results[0]["error"]))
+    tail = 100 * (1 - confidence) / 2
+    lower, upper = np.percentile(params, [tail, 100 - tail], axis=0)
+    return dict(best, ci={name: (float(lo), float(hi)) for name, lo, hi in zip(best["names"], lower, upper)},
+                samples=len(params), failed=samples - len(params))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-start fit and bootstrap confidence intervals of a GNF model")
+    parser.add_argument("filename", help="*.dat, *.csv or *.txt file with shear rate and viscosity/stress columns")
+    parser.add_argument("model", choices=sorted(GNF_MODELS))
+    parser.add_argument("--starts", type=int, default=16, help="initial guesses (default: 16)")
+    parser.add_argument("--spread", type=float, default=10.0, help="guesses scale the seed by up to this factor")
+    parser.add_argument("--bootstrap", type=int, default=0, help="resamplings for confidence intervals (default: none)")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--workers", type=int, default=None, help="fitting processes (default: all cores)")
+    parser.add_argument("--transport", choices=["shared", "pickle"], default="shared",
+                        help="how the dataset reaches the workers (default: shared memory)")
+    parser.add_argument("--max-time", type=float, default=60.0, help="seconds each fit may run")
+    parser.add_argument("--float32", action="store_true", help="share the data as float32 (half the memory)")
+    args = parser.parse_args(argv)
+
+    data = Dataset.FromFile(args.filename, np.float32 if args.float32 else np.float64)
+    x, y = data.x, data.y
+    result = FitStarts(args.model, x, y, args.starts, args.spread, args.workers, args.transport,
+                       dtype=data.dtype, max_time=args.max_time)
+    converged = sum("error" not in start for start in result["starts"])
+    print("{} best of {} starts ({} converged): Rsqr={:.4f} SSE={:.6g}".format(
+          args.model, args.starts, converged, result["r_squared"], result["sse"]))
+    if args.bootstrap:
+        result = Bootstrap(args.model, x, y, args.bootstrap, result["params"], args.confidence, args.workers,
+                           args.transport, dtype=data.dtype, max_time=args.max_time)
+        print("{} bootstrap samples ({} failed)".format(result["samples"], result["failed"]))
+    for name, value in zip(result["names"], result["params"]):
+        lower, upper = result.get("ci", {}).get(name, (None, None))
+        print("{:>3} = {:<12.6g}{}".format(name, value, "" if lower is None else
+              " CI=[{:.6g}, {:.6g}]".format(lower, upper)))
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+
+__doc__ = """
+
+This module has the function(s) that is used to
+
+run profile-likelihood identifiability analysis
+
+on the parameters of the GNF Models.
+
+"""
+
+__author__     = "Osita Sunday Nnyigide"
+
+__copyright__  = "Copyright 2022, Osita Sunday Nnyigide"
+
+__credits__    = ["Hyun Kyu"]
+
+__license__    = "MIT"
+
+__version__    = "1.0.0"
+
+__maintainer__ = "Osita Sunday Nnyigide"
+
+__email__      = "osita@protein-science.com"
+
+__status__     = "Production"
+
+__date__       = "November 22, 2023"
+
+import os
+import sys
+import argparse
+import numpy as np
+from scipy import optimize
+from scipy import stats
+from matplotlib.figure import Figure
+from concurrent.futures import ProcessPoolExecutor
+
+from GNFModels import GeneralizedNeutonianFluidModels, GNF_MODELS
+from ResultsStore import ResultsStore, FileHash
+from SharedData import SharedArrays, Attached
+
+import warnings
+warnings.filterwarnings("ignore")
+
+def ProfileJob(analysis, index, popt, data):
+    with Attached(*data) as (x, y):
+        return analysis.ProfileParameter(index, popt, x, y)
+
+class ProfileLikelihoodAnalysis(GeneralizedNeutonianFluidModels):
+
+    def __init__(self, model, points=21, span=10.0, confidence=0.95, max_nfev=200):
+        self.model = model
+        self.names = GNF_MODELS[model].params
+        self.p0 = GNF_MODELS[model].p0
+        self.points = points + (points + 1) % 2   # odd, so the optimum sits on the grid
+        self.span = span
+        self.confidence = confidence
+        self.threshold = stats.chi2.ppf(confidence, 1)
+        self.max_nfev = max_nfev
+
+    def Residuals(self, params, x, y):
+        fitted_y = GNF_MODELS[self.model].kernel(x, *params)
+        return np.nan_to_num(fitted_y - y, nan=1e30, posinf=1e30, neginf=-1e30)
+
+    def FitFull(self, x, y, p0=None):
+        p0 = self.p0 if p0 is None else p0
+        result = optimize.least_squares(self.Residuals, p0, args=(x, y), x_scale='jac')
+        return result.x, 2 * result.cost
+
+    def ParameterGrid(self, value):
+        if value == 0:
+            return np.linspace(-1.0, 1.0, self.points)
+        return value * np.logspace(-np.log10(self.span), np.log10(self.span), self.points)
+
+    def ProfileParameter(self, index, popt, x, y):
+        grid = self.ParameterGrid(popt[index])
+        free = [i for i in range(len(popt)) if i != index]
+        sse = np.full(self.points, np.nan)
+        centre = self.points // 2
+
+        def residuals(rest, fixed):
+            params = np.empty(len(popt))
+            params[index] = fixed
+            params[free] = rest
+            return self.Residuals(params, x, y)
+
+        # walk outwards from the optimum so every grid point is warm-started
+        # from the solution at its neighbour
+        for direction in (range(centre, self.points), range(centre, -1, -1)):
+            start = np.asarray(popt)[free]
+            for k in direction:
+                try:
+                    result = optimize.least_squares(residuals, start, args=(grid[k],),
+                                                    x_scale='jac', max_nfev=self.max_nfev)
+                except ValueError:
+                    continue
+                sse[k] = 2 * result.cost
+                start = result.x
+        return index, grid, sse
+
+    def Summarize(self, grid, delta):
+        centre = self.points // 2
+        bounds = []
+        for side in (range(centre, -1, -1), range(centre, self.points)):
+            bound = None
+            previous = centre
+            for k in side:
+                if np.isfinite(delta[k]) and delta[k] >= self.threshold:
+                    t = (self.threshold - delta[previous]) / (delta[k] - delta[previous])
+                    bound = grid[previous] + t * (grid[k] - grid[previous])
+                    break
+                if np.isfinite(delta[k]):
+                    previous = k
+            bounds.append(bound)
+        if grid[-1] < grid[0]:
+            bounds.reverse()
+        return tuple(bounds), None not in bounds
+
+    def Run(self, x, y, p0=None, workers=None):
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        popt, sse_fit = self.FitFull(x, y, p0)
+        workers = workers or os.cpu_count() or 1
+
+        if workers == 1:
+            profiles = [self.ProfileParameter(i, popt, x, y) for i in range(len(popt))]
+        else:
+            # the workers read x and y from shared memory instead of a pickled copy each
+            with SharedArrays() as shared, ProcessPoolExecutor(max_workers=min(workers, len(popt))) as executor:
+                data = shared.Share(x, y)
+                jobs = [executor.submit(ProfileJob, self, i, popt, data) for i in range(len(popt))]
+                profiles = [job.result() for job in jobs]
+
+        # a profile may find a better optimum than the full fit did
+        sse_min = min([sse_fit] + [np.nanmin(sse) for _, _, sse in profiles])
+
+        report = {"model": self.model, "params": dict(zip(self.names, popt)),
+                  "sse": sse_fit, "threshold": self.threshold, "profiles": {}}
+        for index, grid, sse in profiles:
+            delta = len(x) * np.log(sse / sse_min)
+            ci, identifiable = self.Summarize(grid, delta)
+            report["profiles"][self.names[index]] = {"grid": grid, "sse": sse, "delta": delta,
+                                                     "ci": ci, "identifiable": identifiable}
+        return report
+
+    def PlotProfiles(self, report, filename="profile_likelihood.png"):
+        names = list(report["profiles"])
+        fig = Figure(figsize=(3*len(names), 3))
+        axes = fig.subplots(1, len(names), squeeze=False)
+        for ax, name in zip(axes[0], names):
+            profile = report["profiles"][name]
+            ax.plot(profile["grid"], profile["delta"], 'o-', markersize=3)
+            ax.axhline(report["threshold"], ls='--', color='red')
+            ax.axvline(report["params"][name], ls=':', color='grey')
+            if np.all(profile["grid"] > 0):
+                ax.set_xscale('log')
+            ax.set_xlabel(name, family="serif", fontsize=12)
+            ax.set_title("identifiable" if profile["identifiable"] else "unidentifiable", fontsize=9)
+        axes[0][0].set_ylabel("Δ(-2 log L)", family="serif", fontsize=12)
+        fig.tight_layout()
+        fig.savefig(filename, format="png", dpi=300, bbox_inches='tight')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile-likelihood identifiability analysis of a GNF fit")
+    parser.add_argument("filename", help="*.dat, *.csv or *.txt file with shear rate and viscosity/stress columns")
+    parser.add_argument("model", choices=sorted(GNF_MODELS))
+    parser.add_argument("--points", type=int, default=21, help="grid points per parameter")
+    parser.add_argument("--span", type=float, default=10.0, help="grid spans [value/span, value*span]")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--plot", default=None, help="save the profile curves to this png")
+    parser.add_argument("--store", default=None, help="SQLite file to keep the fit and its intervals in")
+    args = parser.parse_args(argv)
+
+    analysis = ProfileLikelihoodAnalysis(args.model, args.points, args.span, args.confidence)
+    x, y = analysis.LoadData(args.filename)
+    report = analysis.Run(x, y, workers=args.workers)
+
+    print("{} fit, SSE={:.6g}".format(report["model"], report["sse"]))
+    for name, profile in report["profiles"].items():
+        lower, upper = profile["ci"]
+        print("{:>3} = {:<12.6g} CI=[{}, {}] {}".format(
+              name, report["params"][name],
+              "-inf" if lower is None else "{:.6g}".format(lower),
+              "+inf" if upper is None else "{:.6g}".format(upper),
+              "" if profile["identifiable"] else "UNIDENTIFIABLE"))
+    if args.plot:
+        analysis.PlotProfiles(report, args.plot)
+    if args.store:
+        with ResultsStore(args.store) as store:
+            result = analysis.FitModel(args.model, x, y, list(report["params"].values()))
+            ci = {name: profile["ci"] for name, profile in report["profiles"].items()}
+            store.Insert(result, os.path.splitext(os.path.basename(args.filename))[0], FileHash(args.filename), ci)
+
+if __name__ == "__main__":
+
+    sys.exit(main())
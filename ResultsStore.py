@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+
+__doc__ = """
+
+This module has the function(s) that is used to
+
+keep every GNF Model fit in a local SQLite store, so
+
+that results of many samples can be queried, trended
+
+and exported without fitting the data again.
+
+"""
+
+__author__     = "Osita Sunday Nnyigide"
+
+__copyright__  = "Copyright 2022, Osita Sunday Nnyigide"
+
+__credits__    = ["Hyun Kyu"]
+
+__license__    = "MIT"
+
+__version__    = "1.0.0"
+
+__maintainer__ = "Osita Sunday Nnyigide"
+
+__email__      = "osita@protein-science.com"
+
+__status__     = "Production"
+
+__date__       = "November 22, 2023"
+
+import os
+import sys
+import csv
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from GNFModels import GeneralizedNeutonianFluidModels, GNF_MODELS
+
+import warnings
+warnings.filterwarnings("ignore")
+
+# params and ci are JSON objects keyed by parameter name; created is unix time
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fits (
+    id        INTEGER PRIMARY KEY,
+    sample    TEXT NOT NULL,
+    file_hash TEXT,
+    model     TEXT NOT NULL,
+    residuals TEXT NOT NULL DEFAULT 'linear',
+    params    TEXT NOT NULL,
+    ci        TEXT,
+    r_squared REAL,
+    sse       REAL,
+    nfev      INTEGER,
+    elapsed_s REAL,
+    status    TEXT,
+    created   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fits_by_sample ON fits (sample, created);
+CREATE INDEX IF NOT EXISTS fits_by_model  ON fits (model, created);
+CREATE INDEX IF NOT EXISTS fits_by_date   ON fits (created);
+CREATE INDEX IF NOT EXISTS fits_by_hash   ON fits (file_hash, model);
+"""
+COLUMNS = ["id", "sample", "file_hash", "model", "residuals", "params", "ci",
+           "r_squared", "sse", "nfev", "elapsed_s", "status", "created"]
+
+def FileHash(filename, block=2**20):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def FitFile(job):
+    filename, model, residuals, budget = job
+    start = time.perf_counter()
+    models = GeneralizedNeutonianFluidModels()
+    try:
+        x, y = models.LoadData(filename)
+        result = models.FitModel(model, x, y, residuals=residuals, **budget)
+    except Exception as e:
+        result = {"model": model, "error": "{}: {}".format(type(e).__name__, e)}
+    result["elapsed_s"] = time.perf_counter() - start
+    return result
+
+class ResultsStore:
+
+    def __init__(self, filename="fit_results.sqlite"):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.row_factory = sqlite3.Row
+        # WAL lets readers query while a batch run is writing
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        # stores made before fits reported a termination reason
+        if "status" not in [row[1] for row in self.connection.execute("PRAGMA table_info(fits)")]:
+            self.connection.execute("ALTER TABLE fits ADD COLUMN status TEXT")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.Close()
+
+    def Close(self):
+        self.connection.close()
+
+    def Row(self, result, sample, file_hash=None, ci=None, created=None):
+        names = result.get("names") or GNF_MODELS[result["model"]].params
+        params = result["params"]
+        if not isinstance(params, dict):
+            params = dict(zip(names, params))
+        return (sample, file_hash, result["model"], result.get("residuals", "linear"),
+                json.dumps({k: float(v) for k, v in params.items()}, ensure_ascii=False),
+                None if ci is None else json.dumps(ci, ensure_ascii=False),
+                result.get("r_squared"), result.get("sse"), result.get("nfev"),
+                result.get("elapsed_s"), result.get("status"), time.time() if created is None else created)
+
+    def Insert(self, result, sample, file_hash=None, ci=None, created=None):
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO fits ({}) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)".format(", ".join(COLUMNS[1:])),
+                self.Row(result, sample, file_hash, ci, created))
+        return cursor.lastrowid
+
+    def InsertMany(self, entries):
+        """
+        Insert an iterable of (result, sample, file_hash, ci) in a single
+        transaction; results that carry an "error" are skipped.
+        """
+        rows = (self.Row(*entry) for entry in entries if "error" not in entry[0])
+        with self.connection:
+            cursor = self.connection.executemany(
+                "INSERT INTO fits ({}) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)".format(", ".join(COLUMNS[1:])), rows)
+        return cursor.rowcount
+
+    def Where(self, sample=None, model=None, since=None, until=None):
+        clauses, values = [], []
+        for column, operator, value in (("sample", "=", sample), ("model", "=", model),
+                                        ("created", ">=", since), ("created", "<", until)):
+            if value is not None:
+                clauses.append("{} {} ?".format(column, operator))
+                values.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), values
+
+    def Query(self, sample=None, model=None, since=None, until=None, limit=None):
+        where, values = self.Where(sample, model, since, until)
+        sql = "SELECT * FROM fits" + where + " ORDER BY created"
+        if limit is not None:
+            sql += " LIMIT {:d}".format(limit)
+        results = []
+        for row in self.connection.execute(sql, values):
+            result = dict(row)
+            result["params"] = json.loads(result["params"])
+            result["ci"] = None if result["ci"] is None else json.loads(result["ci"])
+            results.append(result)
+        return results
+
+    def Contains(self, file_hash, model):
+        return self.connection.execute("SELECT 1 FROM fits WHERE file_hash = ? AND model = ? LIMIT 1",
+                                       (file_hash, model)).fetchone() is not None
+
+    def Trend(self, model, param, sample=None, since=None, until=None):
+        """
+        Return the fit times and the values of `param` of `model` as arrays,
+        read straight from the store with SQLite's JSON functions.
+        """
+        where, values = self.Where(sample, model, since, until)
+        rows = self.connection.execute("SELECT created, json_extract(params, ?) FROM fits" + where +
+                                       " ORDER BY created", ['$."{}"'.format(param)] + values).fetchall()
+        data = np.array(rows, dtype=np.float64).reshape(-1, 2)
+        return data[:, 0], data[:, 1]
+
+    def Export(self, filename, sample=None, model=None, since=None, until=None, chunk=10000):
+        """
+        Write the selected fits to a CSV file. With a model the parameters
+        are written one per column, otherwise as a JSON object.
+        """
+        where, values = self.Where(sample, model, since, until)
+        names = GNF_MODELS[model].params if model in GNF_MODELS else []
+        columns = ["id", "sample", "file_hash", "model", "residuals",
+                   "datetime(created, 'unixepoch') AS created", "r_squared", "sse", "nfev", "elapsed_s", "status"]
+        if names:
+            columns += ["json_extract(params, '$.\"{}\"')".format(name) for name in names]
+            columns += ["ci"]
+            header = [c.split(" AS ")[-1] for c in columns[:-len(names) - 1]] + names + ["ci"]
+        else:
+            columns += ["params", "ci"]
+            header = [c.split(" AS ")[-1] for c in columns]
+
+        cursor = self.connection.execute("SELECT {} FROM fits{} ORDER BY created".format(", ".join(columns), where), values)
+        count = 0
+        with open(filename, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            while True:
+                rows = cursor.fetchmany(chunk)
+                if not rows:
+                    break
+                writer.writerows(rows)
+                count += len(rows)
+        return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SQLite store of GNF fit results")
+    parser.add_argument("--db", default="fit_results.sqlite", help="store file (default: fit_results.sqlite)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fit = commands.add_parser("fit", help="fit data files and store the results")
+    fit.add_argument("model", choices=sorted(GNF_MODELS))
+    fit.add_argument("filenames", nargs="+")
+    fit.add_argument("--residuals", choices=["linear", "log", "relative"], default="linear")
+    fit.add_argument("--workers", type=int, default=None)
+    fit.add_argument("--refit", action="store_true", help="fit files that are already in the store again")
+    fit.add_argument("--max-nfev", type=int, default=None, help="function evaluations a fit may use")
+    fit.add_argument("--max-time", type=float, default=None, help="seconds a fit may run")
+
+    query = commands.add_parser("query", help="print stored fits")
+    export = commands.add_parser("export", help="write stored fits to a CSV file")
+    export.add_argument("output")
+    for command in (query, export):
+        command.add_argument("--sample", default=None)
+        command.add_argument("--model", default=None)
+        command.add_argument("--since", default=None, help="ISO date, e.g. 2023-11-01")
+        command.add_argument("--until", default=None, help="ISO date, e.g. 2023-12-01")
+    args = parser.parse_args(argv)
+
+    with ResultsStore(args.db) as store:
+        if args.command == "fit":
+            files = [(filename, FileHash(filename)) for filename in args.filenames]
+            if not args.refit:
+                files = [(filename, digest) for filename, digest in files if not store.Contains(digest, args.model)]
+            budget = {"max_nfev": args.max_nfev, "max_time": args.max_time}
+            jobs = [(filename, args.model, args.residuals, budget) for filename, _ in files]
+            with ProcessPoolExecutor(max_workers=args.workers) as executor:
+                results = list(executor.map(FitFile, jobs, chunksize=max(1, len(jobs) // 64)))
+            stored = store.InsertMany((result, os.path.splitext(os.path.basename(filename))[0], digest, None)
+                                      for (filename, digest), result in zip(files, results))
+            for (filename, _), result in zip(files, results):
+                if "error" in result:
+                    print("{}: {}".format(filename, result["error"]))
+                elif result["status"] != "converged":
+                    print("{}: {}, best parameters so far stored".format(filename, result["status"].replace("_", " ")))
+            print("stored {} of {} fits in {}".format(stored, len(args.filenames), args.db))
+            return
+
+        since = None if args.since is None else time.mktime(time.strptime(args.since, "%Y-%m-%d"))
+        until = None if args.until is None else time.mktime(time.strptime(args.until, "%Y-%m-%d"))
+        if args.command == "export":
+            count = store.Export(args.output, args.sample, args.model, since, until)
+            print("wrote {} fits to {}".format(count, args.output))
+            return
+        for result in store.Query(args.sample, args.model, since, until):
+            # SQLite keeps an undefined Rsqr (NaN, e.g. for constant data) as NULL
+            r_squared = "n/a" if result["r_squared"] is None else "{:.4f}".format(result["r_squared"])
+            print("{:>6} {:<20} {:<16} {} Rsqr={} {}".format(
+                  result["id"], result["sample"], result["model"],
+                  time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(result["created"])),
+                  r_squared, " ".join("{}={:.6g}".format(k, v) for k, v in result["params"].items())))
+
+if __name__ == "__main__":
+
+    sys.exit(main())
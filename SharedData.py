@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+__doc__ = """
+
+This module has the function(s) that is used to
+
+hand large datasets to worker processes without
+
+pickling them: the arrays are copied once into shared
+
+memory and the workers get small handles from which
+
+they read the same memory, without copying it.
+
+"""
+
+__author__     = "Osita Sunday Nnyigide"
+
+__copyright__  = "Copyright 2022, Osita Sunday Nnyigide"
+
+__credits__    = ["Hyun Kyu"]
+
+__license__    = "MIT"
+
+__version__    = "1.0.0"
+
+__maintainer__ = "Osita Sunday Nnyigide"
+
+__email__      = "osita@protein-science.com"
+
+__status__     = "Production"
+
+__date__       = "November 22, 2023"
+
+import weakref
+from collections import namedtuple
+from multiprocessing import shared_memory
+import numpy as np
+
+# where one array sits in a shared memory block; this is all that is pickled
+ArrayHandle = namedtuple("ArrayHandle", ["block", "offset", "shape", "dtype"])
+
+ALIGN = 64
+
+# blocks a worker could not close yet because an array of them was still
+# referenced when its with block ended; they are closed by a later one
+UNCLOSED = []
+
+def Release(blocks):
+    while blocks:
+        block = blocks.pop()
+        block.close()
+        try:
+            block.unlink()
+        except FileNotFoundError:
+            pass
+
+class SharedArrays:
+    """
+    Owner of the shared memory blocks of one batch of work. Share copies
+    arrays into a new block and returns their handles; the blocks are freed
+    by Close, at the end of a with block, or when the object is collected,
+    whichever comes first. Workers that are still reading keep their own
+    mapping until they detach, so freeing early never pulls memory from
+    under them.
+    """
+
+    def __init__(self):
+        self.blocks = []
+        self.finalizer = weakref.finalize(self, Release, self.blocks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.Close()
+
+    def Close(self):
+        self.finalizer()
+
+    def Share(self, *arrays):
+        arrays = [np.ascontiguousarray(array) for array in arrays]
+        offsets = [0]
+        for array in arrays:
+            offsets.append(offsets[-1] + -(-array.nbytes // ALIGN) * ALIGN)
+        block = shared_memory.SharedMemory(create=True, size=max(offsets[-1], 1))
+        self.blocks.append(block)
+        handles = []
+        for array, offset in zip(arrays, offsets):
+            np.ndarray(array.shape, array.dtype, block.buf, offset)[...] = array
+            handles.append(ArrayHandle(block.name, offset, array.shape, array.dtype.str))
+        return handles
+
+    @property
+    def nbytes(self):
+        return sum(block.size for block in self.blocks)
+
+class Attached:
+    """
+    Read-only arrays of `handles` in a worker process, viewing the shared
+    memory directly, for the duration of a with block:
+
+        with Attached(hx, hy) as (x, y):
+            ...
+
+    Handles that are already arrays are passed through, so the same worker
+    code serves pickled and shared data.
+    """
+
+    def __init__(self, *handles):
+        self.handles = handles
+        self.blocks = {}
+
+    def __enter__(self):
+        arrays = []
+        for handle in self.handles:
+            if not isinstance(handle, ArrayHandle):
+                arrays.append(handle)
+                continue
+            if handle.block not in self.blocks:
+                self.blocks[handle.block] = shared_memory.SharedMemory(name=handle.block)
+            array = np.ndarray(handle.shape, np.dtype(handle.dtype), self.blocks[handle.block].buf, handle.offset)
+            array.flags.writeable = False
+            arrays.append(array)
+        return arrays
+
+    def __exit__(self, *exc):
+        blocks = UNCLOSED[:] + list(self.blocks.values())
+        del UNCLOSED[:]
+        self.blocks = {}
+        for block in blocks:
+            try:
+                block.close()
+            except BufferError:
+                UNCLOSED.append(block)
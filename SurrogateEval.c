@@ -0,0 +1,61 @@
+/*
+ * Reference evaluator of the tabulated GNF surrogates (.gnft files) written
+ * by SurrogateExport.py, for flow solvers written in C, C++ or Fortran.
+ *
+ * c points to the coefficients as they follow the 40-byte header of the
+ * file (version 2), which keeps them 8-byte aligned in a mapped file: four
+ * arrays c0, c1, c2, c3 of n = knots - 1 doubles each. Shear rates outside
+ * the table (and x <= 0) are clamped to its ends.
+ *
+ * Author: Osita Sunday Nnyigide, osita@protein-science.com
+ * License: MIT
+ */
+
+#include <math.h>
+#include <stddef.h>
+
+/* u is log10(x) in units of the knot spacing, measured from the first knot */
+static double gnft_interval(const double *c, size_t n, double top, double u)
+{
+    size_t i;
+    double t;
+
+    if (!(u > 0.0))   /* also NaN, from log10 of x <= 0 */
+        u = 0.0;
+    if (u > top)
+        u = top;
+    i = (size_t)u;
+    t = u - (double)i;
+    return ((c[3 * n + i] * t + c[2 * n + i]) * t + c[n + i]) * t + c[i];
+}
+
+double gnft_eval_log(const double *c, size_t n, double log_x0, double step, double log_x)
+{
+    return gnft_interval(c, n, nextafter((double)n, 0.0), (log_x - log_x0) / step);
+}
+
+double gnft_eval(const double *c, size_t n, double log_x0, double step, double x)
+{
+    return gnft_eval_log(c, n, log_x0, step, log10(x));
+}
+
+void gnft_evaluate(const double *c, size_t n, double log_x0, double step,
+                   const double *x, double *y, size_t count)
+{
+    /* log is about twice as fast as log10 in glibc; the scale folds in 1/ln(10) */
+    double top = nextafter((double)n, 0.0), scale = 1.0 / (step * log(10.0)), shift = log_x0 / step;
+    size_t k;
+
+    for (k = 0; k < count; k++)
+        y[k] = gnft_interval(c, n, top, log(x[k]) * scale - shift);
+}
+
+void gnft_evaluate_log(const double *c, size_t n, double log_x0, double step,
+                       const double *log_x, double *y, size_t count)
+{
+    double top = nextafter((double)n, 0.0), scale = 1.0 / step;
+    size_t k;
+
+    for (k = 0; k < count; k++)
+        y[k] = gnft_interval(c, n, top, (log_x[k] - log_x0) * scale);
+}
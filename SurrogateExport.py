@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+
+__doc__ = """
+
+This module has the function(s) that is used to
+
+export a fitted GNF Model as a tabulated surrogate
+
+(a monotone piecewise cubic over log shear rate)
+
+for fast evaluation inside flow solvers.
+
+"""
+
+__author__     = "Osita Sunday Nnyigide"
+
+__copyright__  = "Copyright 2022, Osita Sunday Nnyigide"
+
+__credits__    = ["Hyun Kyu"]
+
+__license__    = "MIT"
+
+__version__    = "1.0.0"
+
+__maintainer__ = "Osita Sunday Nnyigide"
+
+__email__      = "osita@protein-science.com"
+
+__status__     = "Production"
+
+__date__       = "November 22, 2023"
+
+import os
+import ast
+import sys
+import time
+import ctypes
+import shutil
+import struct
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from scipy import interpolate
+
+from GNFModels import GNF_MODELS
+from ModelPrediction import ModelPrediction
+
+import warnings
+warnings.filterwarnings("ignore")
+
+# file layout: header, then the four cubic coefficient columns (constant term first),
+# one float64 per interval each
+MAGIC = b"GNFT"
+VERSION = 2
+# magic, version, reserved, knots, padding, log10 x_min, step, rel. error; 40 bytes, so the
+# coefficients that follow are 8-byte aligned (version 1 had no padding)
+HEADER = struct.Struct("<4sHHIIddd")
+
+class TabulatedSurrogate:
+
+    __slots__ = ("log_x0", "step", "coefficients", "error")
+
+    def __init__(self, log_x0, step, coefficients, error=np.nan):
+        self.log_x0 = log_x0
+        self.step = step
+        # one contiguous array per power of t, so each lookup is a 1-d take
+        self.coefficients = [np.ascontiguousarray(c, dtype=np.float64) for c in coefficients]
+        self.error = error
+
+    @property
+    def intervals(self):
+        return len(self.coefficients[0])
+
+    @property
+    def x_range(self):
+        return 10**self.log_x0, 10**(self.log_x0 + self.step * self.intervals)
+
+    def Evaluate(self, x):
+        with np.errstate(all="ignore"):   # x <= 0 gives nan/-inf, sent to the first knot
+            u = np.log10(np.atleast_1d(x), dtype=np.float64)
+        y = self.EvaluateLog(u, overwrite=True)
+        return y if np.ndim(x) else y[0]
+
+    def EvaluateLog(self, log_x, overwrite=False):
+        """
+        The table at log10 shear rates `log_x`, for callers that already work
+        in log10(x); saves the log10 of Evaluate. With overwrite=True `log_x`
+        (a float64 array) is used as scratch space.
+        """
+        u = log_x if overwrite else np.array(log_x, dtype=np.float64, ndmin=1)
+        # knots are uniform in log10(x), so the interval index is a multiply and
+        # a floor; fmax also sends nan to the first knot
+        u -= self.log_x0
+        u *= 1.0 / self.step
+        np.fmax(u, 0.0, out=u)
+        np.minimum(u, np.nextafter(self.intervals, 0), out=u)
+        i = u.astype(np.intp)
+        u -= i
+
+        # Horner in place; take(out=) is only unbuffered with mode='clip'
+        c0, c1, c2, c3 = self.coefficients
+        y = np.take(c3, i, mode='clip')
+        term = np.empty_like(y)
+        for c in (c2, c1, c0):
+            y *= u
+            y += np.take(c, i, out=term, mode='clip')
+        return y
+
+    def Save(self, filename):
+        with open(filename, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, self.intervals + 1, 0, self.log_x0, self.step, self.error))
+            for c in self.coefficients:
+                f.write(c.astype("<f8").tobytes())
+
+    @classmethod
+    def Load(cls, filename):
+        with open(filename, "rb") as f:
+            header = f.read(HEADER.size)
+            if len(header) < 6 or header[:4] != MAGIC:
+                raise ValueError("{} is not a GNF surrogate table".format(filename))
+            if struct.unpack("<H", header[4:6])[0] != VERSION:
+                raise ValueError("{} is a table of another format version; export it again".format(filename))
+            if len(header) < HEADER.size:
+                raise ValueError("{} is truncated: its header is {} bytes long".format(filename, len(header)))
+            magic, version, _, knots, _, log_x0, step, error = HEADER.unpack(header)
+            data = f.read()
+        if knots < 2 or len(data) != 4 * 8 * (knots - 1):
+            raise ValueError("{} is truncated or corrupt: {} knots need {} bytes of coefficients, found {}".format(
+                             filename, knots, 4 * 8 * max(knots - 1, 0), len(data)))
+        coefficients = np.frombuffer(data, dtype="<f8").reshape(4, knots - 1)
+        return cls(log_x0, step, coefficients, error)
+
+SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "SurrogateEval.c")
+
+# NumPy functions of the model expressions and their C99 names
+C_FUNCTIONS = {"arcsinh": "asinh", "arccosh": "acosh", "arctanh": "atanh", "arctan": "atan"}
+C_OPERATORS = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/"}
+
+def CExpression(node, params):
+    """
+    C99 source of a (registry-checked) model expression in x and p[0], p[1], ...
+    """
+    if isinstance(node, ast.Expression):
+        return CExpression(node.body, params)
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow):
+        return "pow({}, {})".format(CExpression(node.left, params), CExpression(node.right, params))
+    if isinstance(node, ast.BinOp):
+        return "({} {} {})".format(CExpression(node.left, params), C_OPERATORS[type(node.op)],
+                                   CExpression(node.right, params))
+    if isinstance(node, ast.UnaryOp):
+        return "({}{})".format("-" if isinstance(node.op, ast.USub) else "+", CExpression(node.operand, params))
+    if isinstance(node, ast.Call):
+        return "{}({})".format(C_FUNCTIONS.get(node.func.id, node.func.id),
+                               ", ".join(CExpression(arg, params) for arg in node.args))
+    if isinstance(node, ast.Name):
+        return "x" if node.id == "x" else "p[{}]".format(params.index(node.id))
+    return repr(float(node.value))
+
+def BuildLibrary(source, compiler=None):
+    """
+    Compile C `source` into a shared library with the system C compiler and
+    load it, or return None when there is no compiler.
+    """
+    compiler = compiler or os.environ.get("CC") or shutil.which("cc") or shutil.which("gcc")
+    if not compiler:
+        return None
+    folder = tempfile.mkdtemp(prefix="gnft")
+    filename = os.path.join(folder, "evaluate.c")
+    library = os.path.join(folder, "evaluate.so")
+    try:
+        with open(filename, "w") as f:
+            f.write(source)
+        subprocess.run([compiler, "-O2", "-shared", "-fPIC", "-o", library, filename, "-lm"],
+                       check=True, capture_output=True)
+        return ctypes.CDLL(library)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    finally:
+        # a loaded library stays mapped after its file is removed (Windows keeps the folder)
+        shutil.rmtree(folder, ignore_errors=True)
+
+ARRAY = np.ctypeslib.ndpointer(dtype=np.float64, flags="C_CONTIGUOUS")
+
+def CompiledEvaluator(source=SOURCE):
+    """
+    evaluate(surrogate, x) through the C reference evaluator of the tables
+    (SurrogateEval.c, for flow solvers), or None without a C compiler.
+    """
+    with open(source) as f:
+        lib = BuildLibrary(f.read())
+    if lib is None:
+        return None
+    lib.gnft_evaluate.argtypes = [ARRAY, ctypes.c_size_t, ctypes.c_double, ctypes.c_double,
+                                  ARRAY, ARRAY, ctypes.c_size_t]
+    lib.gnft_evaluate.restype = None
+
+    def evaluate(surrogate, x):
+        x = np.ascontiguousarray(x, dtype=np.float64)
+        y = np.empty_like(x)
+        lib.gnft_evaluate(np.concatenate(surrogate.coefficients), surrogate.intervals,
+                          surrogate.log_x0, surrogate.step, x, y, x.size)
+        return y
+
+    return evaluate
+
+def CompiledModel(model):
+    """
+    evaluate(params, x) of the analytic `model` compiled to C, what a flow
+    solver would run without the table, or None without a C compiler.
+    """
+    spec = GNF_MODELS[model]
+    source = """#include <math.h>
+#include <stddef.h>
+void model_evaluate(const double *p, const double *xs, double *y, size_t count)
+{{
+    size_t k;
+    for (k = 0; k < count; k++) {{
+        double x = xs[k];
+        y[k] = {};
+    }}
+}}
+""".format(CExpression(ast.parse(spec.expression, mode="eval"), spec.params))
+    lib = BuildLibrary(source)
+    if lib is None:
+        return None
+    lib.model_evaluate.argtypes = [ARRAY, ARRAY, ARRAY, ctypes.c_size_t]
+    lib.model_evaluate.restype = None
+
+    def evaluate(params, x):
+        x = np.ascontiguousarray(x, dtype=np.float64)
+        y = np.empty_like(x)
+        lib.model_evaluate(np.ascontiguousarray(params, dtype=np.float64), x, y, x.size)
+        return y
+
+    return evaluate
+
+class SurrogateExport(ModelPrediction):
+
+    def __init__(self, rtol=1e-4, samples=8, max_knots=2**16, **kwargs):
+        super().__init__(**kwargs)
+        self.rtol = rtol
+        self.samples = samples
+        self.max_knots = max_knots
+
+    def Tabulate(self, model, params, x_min, x_max, knots, quantity=None):
+        log_x = np.linspace(np.log10(x_min), np.log10(x_max), knots)
+        y = self.Predict(model, params, 10**log_x, quantity)[0]
+        if not np.all(np.isfinite(y)):
+            raise ValueError("{} is not finite on [{:g}, {:g}]".format(model, x_min, x_max))
+
+        step = log_x[1] - log_x[0]
+        slopes = interpolate.PchipInterpolator(log_x, y).derivative()(log_x) * step
+        dy = np.diff(y)
+        coefficients = [y[:-1], slopes[:-1],
+                        3 * dy - 2 * slopes[:-1] - slopes[1:],
+                        slopes[:-1] + slopes[1:] - 2 * dy]
+        return TabulatedSurrogate(log_x[0], step, coefficients)
+
+    def Error(self, surrogate, model, params, quantity=None):
+        # sample every interval at `samples` interior points, the knots are exact
+        n = surrogate.intervals
+        t = (np.arange(n)[:, np.newaxis] + np.arange(1, self.samples + 1) / (self.samples + 1)).ravel()
+        x = 10**(surrogate.log_x0 + surrogate.step * t)
+        exact = self.Predict(model, params, x, quantity)[0]
+        scale = np.maximum(np.abs(exact), np.finfo(float).tiny)
+        return np.max(np.abs(surrogate.Evaluate(x) - exact) / scale)
+
+    def Export(self, model, params, x_min, x_max, filename=None, quantity=None):
+        """
+        Tabulate `model` at `params` on [x_min, x_max], doubling the number of
+        knots until the maximum relative error against the analytic model is
+        below `rtol` on a validation grid `samples` times denser than the
+        table (validated on an 8x grid by default, not guaranteed between
+        its points).
+        """
+        knots = 33
+        while True:
+            surrogate = self.Tabulate(model, params, x_min, x_max, knots, quantity)
+            surrogate.error = self.Error(surrogate, model, params, quantity)
+            if surrogate.error <= self.rtol:
+                break
+            if knots >= self.max_knots:
+                raise ValueError("could not reach rtol={:g} for {} with {} knots (error {:.3g})".format(
+                                 self.rtol, model, knots, surrogate.error))
+            knots = 2 * knots - 1
+        if filename:
+            surrogate.Save(filename)
+        return surrogate
+
+    def Benchmark(self, surrogate, model, params, points=10**6, quantity=None, seed=0):
+        x_min, x_max = surrogate.x_range
+        x = 10**np.random.default_rng(seed).uniform(np.log10(x_min), np.log10(x_max), points)
+        kernel = GNF_MODELS[model].kernel
+        params = np.asarray(params, dtype=np.float64)
+        if (quantity or GNF_MODELS[model].output) != GNF_MODELS[model].output:
+            exact = self.Predict(model, params, x, quantity)[0]
+            analytic = lambda: self.Predict(model, params, x, quantity)
+        else:
+            exact = kernel(x, *params)
+            analytic = lambda: kernel(x, *params)
+
+        log_x = np.log10(x)
+        candidates = {"analytic": analytic, "surrogate": lambda: surrogate.Evaluate(x),
+                      "surrogate_log": lambda: surrogate.EvaluateLog(log_x)}
+        table_c = CompiledEvaluator()
+        model_c = CompiledModel(model) if (quantity or GNF_MODELS[model].output) == GNF_MODELS[model].output else None
+        if table_c is not None and model_c is not None:
+            candidates.update(analytic_c=lambda: model_c(params, x), surrogate_c=lambda: table_c(surrogate, x))
+        timings = {}
+        for name, evaluate in candidates.items():
+            best = np.inf
+            for _ in range(5):
+                start = time.perf_counter()
+                evaluate()
+                best = min(best, time.perf_counter() - start)
+            timings[name + "_s"] = best
+
+        scale = np.maximum(np.abs(exact), np.finfo(float).tiny)
+        error = np.abs(surrogate.Evaluate(x) - exact) / scale
+        report = dict(timings, max_rel_error=float(np.max(error)), mean_rel_error=float(np.mean(error)),
+                      speedup=timings["analytic_s"] / timings["surrogate_s"],
+                      speedup_log=timings["analytic_s"] / timings["surrogate_log_s"],
+                      knots=surrogate.intervals + 1, bytes=HEADER.size + 4 * 8 * surrogate.intervals)
+        if "surrogate_c_s" in timings:
+            # the C table must give the NumPy table's values, and the C model the kernel's
+            report.update(speedup_c=timings["analytic_c_s"] / timings["surrogate_c_s"],
+                          c_max_diff=float(max(np.max(np.abs(table_c(surrogate, x) - surrogate.Evaluate(x)) / scale),
+                                               np.max(np.abs(model_c(params, x) - exact) / scale))))
+        return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a fitted GNF model as a tabulated surrogate")
+    parser.add_argument("model", choices=sorted(GNF_MODELS))
+    parser.add_argument("params", type=float, nargs="+", help="fitted parameters, in the order of the model")
+    parser.add_argument("--range", type=float, nargs=2, default=[1e-3, 1e5], metavar=("X_MIN", "X_MAX"))
+    parser.add_argument("--quantity", choices=["viscosity", "stress"], default=None)
+    parser.add_argument("--rtol", type=float, default=1e-4)
+    parser.add_argument("--out", default="surrogate.gnft")
+    args = parser.parse_args(argv)
+
+    export = SurrogateExport(rtol=args.rtol)
+    surrogate = export.Export(args.model, args.params, *args.range, filename=args.out, quantity=args.quantity)
+    report = export.Benchmark(surrogate, args.model, args.params, quantity=args.quantity)
+    print("{}: {} knots, {} bytes -> {}".format(args.model, report["knots"], report["bytes"], args.out))
+    print("max rel. error {:.3g} on 1e6 random points (validated on an 8x grid: {:.3g}), mean {:.3g}".format(
+          report["max_rel_error"], surrogate.error, report["mean_rel_error"]))
+    print("NumPy per 1e6 points: model {:.4f} s, table {:.4f} s ({:.2f}x), table from log10 x {:.4f} s ({:.2f}x)".format(
+          report["analytic_s"], report["surrogate_s"], report["speedup"], report["surrogate_log_s"], report["speedup_log"]))
+    if "speedup_c" in report:
+        print("C per 1e6 points:     model {:.4f} s, table {:.4f} s ({:.2f}x, SurrogateEval.c)".format(
+              report["analytic_c_s"], report["surrogate_c_s"], report["speedup_c"]))
+    else:
+        print("no C compiler found, SurrogateEval.c was not timed")
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+
+__doc__ = """
+
+This module has the function(s) that is used to
+
+watch a folder that instruments export into, and fit
+
+every new data file as soon as it has been written.
+
+Results go to the SQLite results store and a plot of
+
+each fit is saved next to them.
+
+"""
+
+__author__     = "Osita Sunday Nnyigide"
+
+__copyright__  = "Copyright 2022, Osita Sunday Nnyigide"
+
+__credits__    = ["Hyun Kyu"]
+
+__license__    = "MIT"
+
+__version__    = "1.0.0"
+
+__maintainer__ = "Osita Sunday Nnyigide"
+
+__email__      = "osita@protein-science.com"
+
+__status__     = "Production"
+
+__date__       = "November 22, 2023"
+
+import os
+import sys
+import time
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from GNFModels import GeneralizedNeutonianFluidModels, GNF_MODELS
+from Dataset import Dataset
+from ResultsStore import ResultsStore, FileHash
+import BatchReport
+
+import warnings
+warnings.filterwarnings("ignore")
+
+EXTENSIONS = (".dat", ".txt", ".csv")
+
+def FitAndPlot(job):
+    filename, model, residuals, budget, plot = job
+    sample = os.path.splitext(os.path.basename(filename))[0]
+    start = time.perf_counter()
+    try:
+        data = Dataset.FromFile(filename)
+        result = GeneralizedNeutonianFluidModels().FitModel(model, data.x, data.y, residuals=residuals, **budget)
+    except Exception as e:
+        return {"model": model, "error": "{}: {}".format(type(e).__name__, e),
+                "elapsed_s": time.perf_counter() - start}
+    result["elapsed_s"] = time.perf_counter() - start
+    if plot:
+        BatchReport.TEMPLATE.Draw(sample, result, data.x, data.y)
+        BatchReport.TEMPLATE.fig.savefig(plot, format="png", dpi=BatchReport.TEMPLATE.dpi)
+    return result
+
+class FolderWatcher:
+
+    def __init__(self, folder, model, output=None, store="fit_results.sqlite", residuals="linear",
+                 interval=2.0, settle=2.0, rescan=60.0, workers=None, max_pending=None, extensions=EXTENSIONS,
+                 max_nfev=None, max_time=60.0):
+        self.folder = folder
+        self.model = model
+        self.output = output
+        self.store = store
+        self.residuals = residuals
+        self.budget = {"max_nfev": max_nfev, "max_time": max_time}
+        self.interval = interval
+        self.settle = settle
+        self.rescan = rescan
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * self.workers
+        self.extensions = tuple(extensions)
+        self.seen = {}          # path -> (mtime_ns, size) of files that are done
+        self.candidates = {}    # path -> (mtime_ns, size, time that signature was first seen)
+        self.ready = deque()    # (path, signature, hash) waiting for a free worker
+        self.hashes = set()     # content hashes fitted or queued in this session
+        self.index = None       # the ResultsStore, open while Run is watching
+        self.folder_mtime = None
+        self.last_scan = 0.0
+        self.counters = dict.fromkeys(["fitted", "failed", "duplicates", "stopped"], 0)
+
+    def Scan(self, now):
+        """
+        Look for new or changed files. The folder is listed only when its own
+        mtime changed (a file was created, renamed or removed) or when the
+        periodic rescan is due; otherwise only the unsettled files are stat'ed.
+        """
+        try:
+            folder_mtime = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            return
+        if folder_mtime != self.folder_mtime or now - self.last_scan >= self.rescan:
+            self.folder_mtime = folder_mtime
+            self.last_scan = now
+            with os.scandir(self.folder) as entries:
+                for entry in entries:
+                    if not entry.name.lower().endswith(self.extensions) or not entry.is_file():
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    signature = (stat.st_mtime_ns, stat.st_size)
+                    if self.seen.get(entry.path) != signature and entry.path not in self.candidates:
+                        self.candidates[entry.path] = signature + (now,)
+
+        for path, (mtime, size, since) in list(self.candidates.items()):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                del self.candidates[path]
+                continue
+            if (stat.st_mtime_ns, stat.st_size) != (mtime, size):
+                # still being written; wait until it has been quiet for `settle` seconds
+                self.candidates[path] = (stat.st_mtime_ns, stat.st_size, now)
+            elif now - since >= self.settle and time.time() - mtime / 1e9 >= self.settle:
+                del self.candidates[path]
+                self.Enqueue(path, (mtime, size))
+
+    def Enqueue(self, path, signature):
+        try:
+            digest = FileHash(path)
+        except OSError:
+            return
+        if digest in self.hashes or self.index.Contains(digest, self.model):
+            self.seen[path] = signature
+            self.counters["duplicates"] += 1
+            return
+        self.hashes.add(digest)
+        self.ready.append((path, signature, digest))
+
+    def PlotPath(self, path):
+        if not self.output:
+            return None
+        return os.path.join(self.output, "{}_{}.png".format(os.path.splitext(os.path.basename(path))[0], self.model))
+
+    def Submit(self, executor, running):
+        # backpressure: at most `max_pending` files are handed to the pool,
+        # the rest wait in `ready` (and new arrivals in `candidates`)
+        while self.ready and len(running) < self.max_pending:
+            path, signature, digest = self.ready.popleft()
+            job = (path, self.model, self.residuals, self.budget, self.PlotPath(path))
+            running[executor.submit(FitAndPlot, job)] = (path, signature, digest)
+
+    def Collect(self, done, running, log):
+        for future in done:
+            path, signature, digest = running.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"model": self.model, "error": "{}: {}".format(type(e).__name__, e)}
+            self.seen[path] = signature
+            sample = os.path.splitext(os.path.basename(path))[0]
+            if "error" in result:
+                self.counters["failed"] += 1
+                self.hashes.discard(digest)
+                log("{} failed: {}".format(sample, result["error"]))
+                continue
+            self.index.Insert(result, sample, digest)
+            self.counters["fitted"] += 1
+            self.counters["stopped"] += result["status"] != "converged"
+            log("{} {} Rsqr={:.4f} {}{}".format(sample, self.model, result["r_squared"],
+                " ".join("{}={:.6g}".format(k, v) for k, v in zip(result["names"], result["params"])),
+                "" if result["status"] == "converged" else " ({})".format(result["status"].replace("_", " "))))
+
+    def Run(self, stop=None, log=print):
+        """
+        Watch until `stop` (a threading.Event) is set.
+        """
+        stop = stop or threading.Event()
+        if self.output:
+            os.makedirs(self.output, exist_ok=True)
+        running = {}
+        self.index = ResultsStore(self.store)
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=BatchReport.StartWorker,
+                                     initargs=(100,)) as executor:
+                while not stop.is_set():
+                    self.Scan(time.monotonic())
+                    self.Submit(executor, running)
+                    if running:
+                        done, _ = wait(list(running), timeout=self.interval, return_when=FIRST_COMPLETED)
+                        self.Collect(done, running, log)
+                    else:
+                        stop.wait(self.interval)
+                done, _ = wait(list(running))
+                self.Collect(done, running, log)
+        finally:
+            self.index.Close()
+        return self.counters
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit every data file that appears in a folder")
+    parser.add_argument("folder")
+    parser.add_argument("model", choices=sorted(GNF_MODELS))
+    parser.add_argument("--output", default=None, help="folder for the plots (default: no plots)")
+    parser.add_argument("--store", default="fit_results.sqlite", help="SQLite results store, also the index of fitted files")
+    parser.add_argument("--residuals", choices=["linear", "log", "relative"], default="linear")
+    parser.add_argument("--interval", type=float, default=2.0, help="seconds between polls")
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds a file must be unchanged before it is read")
+    parser.add_argument("--workers", type=int, default=None, help="fitting processes (default: all cores)")
+    parser.add_argument("--max-pending", type=int, default=None, help="files handed to the workers at once")
+    parser.add_argument("--max-nfev", type=int, default=None, help="function evaluations a fit may use")
+    parser.add_argument("--max-time", type=float, default=60.0, help="seconds a fit may run")
+    args = parser.parse_args(argv)
+
+    watcher = FolderWatcher(args.folder, args.model, args.output, args.store, args.residuals,
+                            args.interval, args.settle, workers=args.workers, max_pending=args.max_pending,
+                            max_nfev=args.max_nfev, max_time=args.max_time)
+    print("watching {} for {} files, fitting {} with {} workers".format(
+          args.folder, "/".join(EXTENSIONS), args.model, watcher.workers))
+    stop = threading.Event()
+    try:
+        watcher.Run(stop, log=lambda line: print(time.strftime("%H:%M:%S"), line, flush=True))
+    except KeyboardInterrupt:
+        stop.set()
+    print(watcher.counters)
+
+if __name__ == "__main__":
+
+    sys.exit(main())